@@ -0,0 +1,237 @@
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from metrics import Counter, GaugeCallback, Histogram, _label_key, register
+from llm_backends import TokenBucket
+
+# ---------- Configuration ----------
+# Concurrency units admitted at once: one per interactive request, a batch
+# request takes as many as its concurrency (0 disables admission control)
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "16"))
+# Units batch requests may hold together; the rest is kept for interactive
+ADMISSION_BATCH_MAX_ACTIVE = int(os.getenv("ADMISSION_BATCH_MAX_ACTIVE", "8"))
+# Waiting requests per class; beyond this new requests get 429 immediately
+ADMISSION_QUEUE_INTERACTIVE = int(os.getenv("ADMISSION_QUEUE_INTERACTIVE", "64"))
+ADMISSION_QUEUE_BATCH = int(os.getenv("ADMISSION_QUEUE_BATCH", "8"))
+# Longest a request may wait for a slot before it is shed with 503
+ADMISSION_WAIT_INTERACTIVE = float(os.getenv("ADMISSION_WAIT_INTERACTIVE_SECONDS", "10"))
+ADMISSION_WAIT_BATCH = float(os.getenv("ADMISSION_WAIT_BATCH_SECONDS", "60"))
+# Per-client token buckets (0 = unlimited); a batch costs one token per question
+CLIENT_RATE_PER_MINUTE = int(os.getenv("CLIENT_RATE_PER_MINUTE", "0"))
+CLIENT_BURST = float(os.getenv("CLIENT_BURST", "0")) or None
+API_KEY_HEADER = os.getenv("API_KEY_HEADER", "X-API-Key")
+# Comma-separated keys that get their own bucket; any other key is ignored
+API_KEYS = frozenset(key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip())
+MAX_TRACKED_CLIENTS = 10000
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH)
+
+ADMISSION_WAIT_SECONDS = register(Histogram("pdfqa_admission_wait_seconds",
+                                            "Time requests waited for an admission slot, by class"))
+ADMISSION_REJECTED = register(Counter("pdfqa_admission_rejected_total",
+                                      "Requests shed by admission control, by class and reason"))
+
+
+class AdmissionRejected(Exception):
+    """A request was shed; status is 429 or 503 and retry_after a hint in seconds"""
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class _Waiter:
+    __slots__ = ("future", "units", "enqueued")
+
+    def __init__(self, future: asyncio.Future, units: int):
+        self.future = future
+        self.units = units
+        self.enqueued = time.perf_counter()
+
+
+class AdmissionController:
+    """
+    Bounded, two-class admission in front of the LLM pipeline.
+
+    Requests take concurrency units; when none are free they wait in a
+    bounded FIFO queue for their class. Freed units go to interactive
+    waiters first, and batch requests can never hold more than
+    batch_max_active units, so interactive latency stays flat while batch
+    jobs run. A full queue, or an expected wait longer than the class's
+    max_wait, sheds the request at once with 429 instead of letting it time
+    out later. Per-client token buckets cap each configured API key (or
+    client IP).
+    """
+
+    def __init__(self, max_active: int = ADMISSION_MAX_ACTIVE,
+                 batch_max_active: int = ADMISSION_BATCH_MAX_ACTIVE,
+                 max_queue: Optional[Dict[str, int]] = None,
+                 max_wait: Optional[Dict[str, float]] = None,
+                 client_rate: int = CLIENT_RATE_PER_MINUTE,
+                 client_burst: Optional[float] = CLIENT_BURST):
+        self.max_active = max_active
+        self.batch_max_active = max(1, min(batch_max_active, max_active))
+        self.max_queue = max_queue or {INTERACTIVE: ADMISSION_QUEUE_INTERACTIVE, BATCH: ADMISSION_QUEUE_BATCH}
+        self.max_wait = max_wait or {INTERACTIVE: ADMISSION_WAIT_INTERACTIVE, BATCH: ADMISSION_WAIT_BATCH}
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.active: Dict[str, int] = {cls: 0 for cls in PRIORITY_CLASSES}
+        self.queues: Dict[str, Deque[_Waiter]] = {cls: deque() for cls in PRIORITY_CLASSES}
+        # Moving average of how long a unit is held, for Retry-After estimates
+        self.hold_seconds: Dict[str, float] = {INTERACTIVE: 2.0, BATCH: 30.0}
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._buckets_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_active > 0
+
+    # ---------- Per-client rate limiting ----------
+    def check_rate(self, client: str, cost: float = 1.0, priority: str = INTERACTIVE) -> None:
+        """Charge cost tokens to client's bucket, raising AdmissionRejected(429) if empty"""
+        if not self.client_rate:
+            return
+        with self._buckets_lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.client_rate, self.client_burst)
+                if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+        wait = bucket.try_take(cost)
+        if wait > 0:
+            ADMISSION_REJECTED.inc(**{"class": priority, "reason": "rate_limited"})
+            raise AdmissionRejected(429, "Client rate limit exceeded", wait)
+
+    # ---------- Slots ----------
+    def _fits(self, priority: str, units: int) -> bool:
+        if sum(self.active.values()) + units > self.max_active:
+            return False
+        return priority != BATCH or self.active[BATCH] + units <= self.batch_max_active
+
+    def _expected_wait(self, priority: str, units: int) -> float:
+        """Rough time until a request queued now would be admitted"""
+        capacity = self.batch_max_active if priority == BATCH else self.max_active
+        ahead = sum(w.units for w in self.queues[priority]) + units
+        if priority == BATCH:
+            ahead += sum(w.units for w in self.queues[INTERACTIVE])
+        return self.hold_seconds[priority] * ahead / capacity
+
+    def _dispatch(self) -> None:
+        """Admit queue heads while units are free, interactive first"""
+        for priority in PRIORITY_CLASSES:
+            queue = self.queues[priority]
+            while queue:
+                waiter = queue[0]
+                if waiter.future.done():  # timed out or cancelled
+                    queue.popleft()
+                    continue
+                if not self._fits(priority, waiter.units):
+                    break
+                queue.popleft()
+                self.active[priority] += waiter.units
+                waiter.future.set_result(None)
+            if queue:
+                # Interactive waiters still queued: batch must not jump ahead
+                return
+
+    def _release(self, priority: str, units: int, held: float) -> None:
+        self.active[priority] -= units
+        self.hold_seconds[priority] = 0.8 * self.hold_seconds[priority] + 0.2 * held
+        self._dispatch()
+
+    def units_for(self, priority: str, units: int) -> int:
+        """Units a request will be granted: batch is capped at batch_max_active"""
+        return max(1, min(units, self.batch_max_active)) if priority == BATCH else 1
+
+    async def acquire(self, priority: str, units: int = 1) -> None:
+        units = self.units_for(priority, units)
+        queue = self.queues[priority]
+        blocked = any(self.queues[cls] for cls in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1])
+        if not blocked and self._fits(priority, units):
+            self.active[priority] += units
+            ADMISSION_WAIT_SECONDS.observe(0.0, **{"class": priority})
+            return
+
+        expected = self._expected_wait(priority, units)
+        if len(queue) >= self.max_queue[priority]:
+            ADMISSION_REJECTED.inc(**{"class": priority, "reason": "queue_full"})
+            raise AdmissionRejected(429, f"Too many queued {priority} requests", expected)
+        if expected > self.max_wait[priority]:
+            ADMISSION_REJECTED.inc(**{"class": priority, "reason": "expected_wait"})
+            raise AdmissionRejected(429, f"Server busy; expected wait {expected:.0f}s", expected)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), units)
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait[priority])
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as we gave up: hand the units straight back
+                self.active[priority] -= units
+                self._dispatch()
+            else:
+                waiter.future.cancel()
+                queue.remove(waiter)
+                self._dispatch()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            ADMISSION_REJECTED.inc(**{"class": priority, "reason": "wait_timeout"})
+            raise AdmissionRejected(503, f"Timed out waiting for a slot ({priority})",
+                                    self._expected_wait(priority, units))
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - waiter.enqueued, **{"class": priority})
+
+    @asynccontextmanager
+    async def slot(self, priority: str, units: int = 1) -> AsyncIterator[int]:
+        """Hold admission units for the body of the block; yields the units granted"""
+        if not self.enabled:
+            yield units
+            return
+        units = self.units_for(priority, units)
+        await self.acquire(priority, units)
+        start = time.perf_counter()
+        try:
+            yield units
+        finally:
+            self._release(priority, units, time.perf_counter() - start)
+
+
+def client_key(headers, client_host: Optional[str]) -> str:
+    """
+    Rate-limit identity: a configured API key if one is sent, else the client
+    address. Unknown keys are not trusted, so a client cannot escape its
+    limit (or evict other clients' buckets) by inventing keys.
+    """
+    api_key = headers.get(API_KEY_HEADER)
+    if api_key and api_key in API_KEYS:
+        return f"key:{api_key}"
+    return f"ip:{client_host or 'unknown'}"
+
+
+admission = AdmissionController()
+
+
+def _read_admission() -> Dict[Tuple[Tuple[str, str], ...], float]:
+    samples = {}
+    for priority in PRIORITY_CLASSES:
+        samples[_label_key({"class": priority, "state": "queued"})] = len(admission.queues[priority])
+        samples[_label_key({"class": priority, "state": "active"})] = admission.active[priority]
+    return samples
+
+
+register(GaugeCallback("pdfqa_admission", "Admission queue depth and active units by class", _read_admission))
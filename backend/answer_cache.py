@@ -0,0 +1,113 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from retrieval import tokenize
+
+# ---------- Configuration ----------
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+# Token-set Jaccard similarity for near-duplicate matches; 0 disables them
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?.!？。！")
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of parsed answers.
+
+    scope identifies everything except the question (PDF content hash,
+    format, prompt version, retrieval settings); entries are looked up by
+    normalized question within a scope and, if similarity_threshold > 0, by
+    the most similar cached question in the same scope.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        # (scope, normalized question) -> (expires_at, token set, value)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, FrozenSet[str], Any]]" = OrderedDict()
+        self._by_scope: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, scope: str, question: str) -> Optional[Any]:
+        norm = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((scope, norm))
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end((scope, norm))
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self._drop((scope, norm))
+
+            if self.similarity_threshold > 0:
+                match = self._nearest(scope, frozenset(tokenize(norm)), now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.near_hits += 1
+                    return self._entries[match][2]
+
+            self.misses += 1
+            return None
+
+    def put(self, scope: str, question: str, value: Any) -> None:
+        norm = normalize_question(question)
+        key = (scope, norm)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, frozenset(tokenize(norm)), value)
+            self._entries.move_to_end(key)
+            self._by_scope.setdefault(scope, set()).add(norm)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+
+    def _nearest(self, scope: str, tokens: FrozenSet[str], now: float) -> Optional[Tuple[str, str]]:
+        best_key, best_score = None, self.similarity_threshold
+        for norm in list(self._by_scope.get(scope, ())):
+            key = (scope, norm)
+            expires_at, cached_tokens, _ = self._entries[key]
+            if expires_at <= now:
+                self._drop(key)
+                continue
+            score = _jaccard(tokens, cached_tokens)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        questions = self._by_scope.get(key[0])
+        if questions is not None:
+            questions.discard(key[1])
+            if not questions:
+                del self._by_scope[key[0]]
+
+
+answer_cache = AnswerCache()
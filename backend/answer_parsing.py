@@ -0,0 +1,241 @@
+import os
+import re
+import json
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from metrics import Counter, register
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib parser is used instead
+    orjson = None
+
+# ---------- Configuration ----------
+VALIDATE_CITATIONS = os.getenv("VALIDATE_CITATIONS", "1").lower() in ("1", "true", "yes")
+# Drop citations whose quote is not found anywhere in the cited document
+DROP_UNVERIFIED_CITATIONS = os.getenv("DROP_UNVERIFIED_CITATIONS", "0").lower() in ("1", "true", "yes")
+# A quote missing from its cited page is looked for this many pages either side
+CITATION_PAGE_WINDOW = int(os.getenv("CITATION_PAGE_WINDOW", "2"))
+# Truncation repair gives up after trying this many cut points
+MAX_REPAIR_CUTS = 32
+
+PARSE_RESULTS = register(Counter("pdfqa_answer_parse_total", "Model answer JSON parses by outcome"))
+CITATION_CHECKS = register(Counter("pdfqa_citations_total", "Citation validation results"))
+
+FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+
+def loads(text: str):
+    """Parse JSON with orjson when installed, otherwise the stdlib"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+_DECODE_ERRORS = (ValueError,) if orjson is None else (ValueError, orjson.JSONDecodeError)
+
+
+# ---------- Repair ----------
+def _close_truncated(text: str) -> Tuple[str, List[int]]:
+    """
+    Close an unterminated string and any open objects/arrays. Also returns
+    the positions of top-level-safe cut points (commas between complete
+    values) to fall back to when the tail is unusable.
+    """
+    stack: List[str] = []
+    cuts: List[int] = []
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+        elif ch == ",":
+            cuts.append(i)
+
+    closed = text
+    if in_string:
+        closed += "\\" if escaped else ""
+        closed += '"'
+    closed = closed.rstrip()
+    # A trailing comma or a key without a value cannot be closed as-is
+    closed = re.sub(r',\s*$', "", closed)
+    closed = re.sub(r',?\s*"[^"\\]*"\s*:\s*$', "", closed)
+    return closed + "".join(reversed(stack)), cuts
+
+
+def _drop_empty(value):
+    """Remove the empty objects that closing a cut-off list item leaves behind"""
+    if isinstance(value, dict):
+        return {k: _drop_empty(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_drop_empty(v) for v in value if v != {}]
+    return value
+
+
+def repair_json(text: str) -> Optional[dict]:
+    """
+    Best-effort parse of a JSON object from model output: strips markdown
+    fences and surrounding prose, then closes truncated output, dropping an
+    incomplete trailing value if needed
+    """
+    fenced = FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+    # A complete object followed by prose: take exactly the object, so braces
+    # in the trailing text cannot confuse the truncation repair below
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text)
+        if isinstance(value, dict):
+            return value
+    except ValueError:
+        pass
+
+    closed, cuts = _close_truncated(text)
+    candidates = [closed]
+    for cut in reversed(cuts[-MAX_REPAIR_CUTS:]):
+        candidates.append(_close_truncated(text[:cut])[0])
+
+    for candidate in candidates:
+        try:
+            value = loads(candidate)
+        except _DECODE_ERRORS:
+            continue
+        if isinstance(value, dict):
+            return _drop_empty(value)
+    return None
+
+
+def parse_json_answer(text: str) -> Tuple[Optional[dict], str]:
+    """
+    Parse a model answer as a JSON object. Returns (value, outcome) where
+    outcome is "ok", "repaired" or "failed".
+    """
+    try:
+        value = loads(text)
+        if isinstance(value, dict):
+            PARSE_RESULTS.inc(outcome="ok")
+            return value, "ok"
+    except _DECODE_ERRORS:
+        pass
+    value = repair_json(text)
+    outcome = "repaired" if value is not None else "failed"
+    PARSE_RESULTS.inc(outcome=outcome)
+    return value, outcome
+
+
+# ---------- Citation validation ----------
+_QUOTE_CHARS = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'", "–": "-", "—": "-", "\u00a0": " "})
+_ELLIPSIS_RE = re.compile(r"\s*(?:\.\.\.|…)\s*")
+
+
+def normalize_text(text: str) -> str:
+    """Case-, width-, quote- and whitespace-insensitive form for quote matching"""
+    text = unicodedata.normalize("NFKC", text).translate(_QUOTE_CHARS).lower()
+    return " ".join(text.split())
+
+
+def quote_in_text(quote: str, normalized_page: str) -> bool:
+    """True if every ellipsis-separated fragment of quote occurs in the page, in order"""
+    position = 0
+    fragments = [normalize_text(f) for f in _ELLIPSIS_RE.split(quote)]
+    fragments = [f for f in fragments if f]
+    if not fragments:
+        return False
+    for fragment in fragments:
+        found = normalized_page.find(fragment, position)
+        if found < 0:
+            return False
+        position = found + len(fragment)
+    return True
+
+
+def _candidate_pages(path: str, quote: str, page: int, page_count: int,
+                     find_pages: Optional[Callable[[str, str], Iterable[int]]]) -> List[int]:
+    """Pages to search for a misplaced quote: nearest first, then index hits"""
+    candidates = []
+    if page:
+        for offset in range(1, CITATION_PAGE_WINDOW + 1):
+            candidates.extend((page - offset, page + offset))
+    if find_pages is not None:
+        candidates.extend(find_pages(path, quote))
+    seen = {page}
+    pages = []
+    for p in candidates:
+        if 0 < p <= page_count and p not in seen:
+            seen.add(p)
+            pages.append(p)
+    return pages
+
+
+def validate_citations(citations: List[dict], documents: Dict[str, str],
+                       get_pages: Callable[[str], Sequence[str]],
+                       find_pages: Optional[Callable[[str, str], Iterable[int]]] = None) -> List[dict]:
+    """
+    Check each citation's quote against the cited page of the extracted text.
+
+    documents maps the names the model may cite (file basenames) to PDF
+    paths; with a single document, citations without a "document" use it.
+    A quote found on a nearby page, or on a page find_pages(path, quote)
+    suggests (e.g. from the retrieval index), gets its page corrected; the
+    rest of the document is not scanned. Each citation gains "verified":
+    True/False, or None when it cannot be checked.
+    """
+    normalized: Dict[Tuple[str, int], str] = {}
+
+    def page_text(path: str, page: int) -> str:
+        key = (path, page)
+        if key not in normalized:
+            pages = get_pages(path)
+            normalized[key] = normalize_text(pages[page - 1]) if 0 < page <= len(pages) else ""
+        return normalized[key]
+
+    default_path = next(iter(documents.values())) if len(documents) == 1 else None
+    checked = []
+    for cite in citations:
+        if not isinstance(cite, dict):
+            continue
+        cite = dict(cite)
+        quote = str(cite.get("quote") or "")
+        path = documents.get(os.path.basename(str(cite.get("document") or ""))) or default_path
+        try:
+            page = int(cite.get("page") or 0)
+        except (TypeError, ValueError):
+            page = 0
+
+        if not quote.strip() or path is None:
+            cite["verified"] = None
+            CITATION_CHECKS.inc(result="unchecked")
+        elif page and quote_in_text(quote, page_text(path, page)):
+            cite["verified"] = True
+            CITATION_CHECKS.inc(result="verified")
+        else:
+            # The model often cites a neighbouring page
+            found = next((p for p in _candidate_pages(path, quote, page, len(get_pages(path)), find_pages)
+                          if quote_in_text(quote, page_text(path, p))), None)
+            if found is not None:
+                cite["page"] = found
+                cite["verified"] = True
+                CITATION_CHECKS.inc(result="page_corrected")
+            else:
+                cite["verified"] = False
+                CITATION_CHECKS.inc(result="not_found")
+                if DROP_UNVERIFIED_CITATIONS:
+                    continue
+        checked.append(cite)
+    return checked
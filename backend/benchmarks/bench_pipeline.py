@@ -0,0 +1,229 @@
+"""
+Benchmarks for the extraction -> prompt -> answer pipeline.
+
+Runs against a deterministic mock LLM with configurable latency and prints
+(or writes) a JSON report so results can be compared between commits:
+
+    python benchmarks/bench_pipeline.py --output bench.json
+    python benchmarks/bench_pipeline.py --synthetic-pages 500 --concurrency 1 8 32
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Callable, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import pdf_qa  # noqa: E402
+from pdf_cache import extraction_cache  # noqa: E402
+from retrieval import bm25_indexes, corpus_indexes  # noqa: E402
+from answer_cache import answer_cache  # noqa: E402
+from llm_backends import LLMRouter, MockBackend, MockClient  # noqa: E402
+from token_budget import load_tokenizer  # noqa: E402
+
+
+# ---------- Mock LLM ----------
+class LatencyMockClient(MockClient):
+    """MockClient that sleeps `latency` seconds per completion"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        create = self.chat.completions.create
+
+        def delayed_create(**kwargs):
+            time.sleep(latency)
+            return create(**kwargs)
+
+        self.chat.completions.create = delayed_create
+
+
+# ---------- Helpers ----------
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def timed(func: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def reset_caches() -> None:
+    extraction_cache.clear()
+    bm25_indexes.clear()
+    corpus_indexes.clear()
+    answer_cache.clear()
+
+
+def make_synthetic_pdf(path: str, pages: int) -> None:
+    """Write a text-only PDF with `pages` pages of manual-like content"""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        body = "\n".join(
+            f"Section {i + 1}.{line}: inspect the harness webbing, buckles and anchor "
+            f"point {line} before each use; replace after a fall arrest event."
+            for line in range(40)
+        )
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), body, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+# ---------- Benchmarks ----------
+def bench_extraction(pdf_paths: List[str], repeat: int) -> Dict[str, dict]:
+    results = {}
+    for path in pdf_paths:
+        name = os.path.basename(path)
+        for method in ("pymupdf", "parallel"):
+            pages = pdf_qa.extract_pages_for_method(path, method)
+            samples = timed(lambda: pdf_qa.extract_pages_for_method(path, method), repeat)
+            stats = summarize(samples)
+            stats["pages"] = len(pages)
+            stats["pages_per_sec"] = len(pages) / statistics.fmean(samples) if samples else 0.0
+            results[f"{name}:{method}"] = stats
+
+        reset_caches()
+        cold = timed(lambda: pdf_qa.get_pdf_pages(path), 1)
+        warm = timed(lambda: pdf_qa.get_pdf_pages(path), repeat)
+        results[f"{name}:cache"] = {"cold_ms": cold[0] * 1000, "warm": summarize(warm)}
+    return results
+
+
+def bench_prompt(pdf_paths: List[str], question: str, repeat: int) -> Dict[str, dict]:
+    results = {}
+    for path in pdf_paths:
+        name = os.path.basename(path)
+        pages = pdf_qa.get_pdf_pages(path)
+        block = pdf_qa.build_paged_block({path: pages})
+        results[f"{name}:build_paged_block"] = dict(
+            summarize(timed(lambda: pdf_qa.build_paged_block({path: pages}), repeat)),
+            chars=len(block),
+        )
+        prompt = pdf_qa.build_qa_prompt(path, question)
+        results[f"{name}:build_qa_prompt"] = dict(
+            summarize(timed(lambda: pdf_qa.build_qa_prompt(path, question), repeat)),
+            chars=len(prompt or ""),
+        )
+    return results
+
+
+async def _load(app, pdf: str, question: str, requests: int, concurrency: int, use_cache: bool) -> dict:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=None) as client:
+        async def one(i: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/ask", json={
+                    "question": question if use_cache else f"{question} #{i}",
+                    "pdf": pdf,
+                    "use_cache": use_cache,
+                })
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    stats = summarize(latencies)
+    stats.update({"concurrency": concurrency, "errors": errors, "throughput_rps": requests / elapsed})
+    return stats
+
+
+def bench_ask(pdf: str, question: str, requests: int, concurrency_levels: List[int]) -> Dict[str, dict]:
+    import main
+
+    results = {}
+    for concurrency in concurrency_levels:
+        for use_cache in (False, True):
+            answer_cache.clear()
+            key = f"c{concurrency}:{'answer_cache' if use_cache else 'no_answer_cache'}"
+            results[key] = asyncio.run(_load(main.app, pdf, question, requests, concurrency, use_cache))
+    return results
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default=os.path.join(BACKEND_DIR, "pdfs"))
+    parser.add_argument("--synthetic-pages", type=int, default=200,
+                        help="pages in the generated large PDF (0 to skip)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="mock LLM latency in seconds")
+    parser.add_argument("--requests", type=int, default=64, help="/ask requests per load level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--question", default="How should the harness be inspected before use?")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    pdf_qa.set_llm(LLMRouter([MockBackend(LatencyMockClient(args.llm_latency))]))
+    load_tokenizer()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep benchmark cache files out of the real cache directory
+        extraction_cache.cache_dir = os.path.join(tmp, "cache")
+        pdf_paths = sorted(
+            os.path.join(args.pdf_dir, f) for f in os.listdir(args.pdf_dir) if f.lower().endswith(".pdf")
+        )
+        if args.synthetic_pages:
+            synthetic = os.path.join(tmp, f"synthetic-{args.synthetic_pages}p.pdf")
+            make_synthetic_pdf(synthetic, args.synthetic_pages)
+            pdf_paths.append(synthetic)
+
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "config": vars(args),
+            "extraction": bench_extraction(pdf_paths, args.repeat),
+            "prompt": bench_prompt(pdf_paths, args.question, args.repeat),
+            "ask": bench_ask(pdf_paths[0], args.question, args.requests, args.concurrency),
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Wrote benchmark report to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,127 @@
+"""
+Cold-start benchmark: import-time breakdown of `main` plus time until a
+fresh uvicorn worker has the port open (/health) and is warm (/ready).
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --top 30 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_breakdown(top: int) -> Dict[str, object]:
+    """
+    Run `python -X importtime -c "import main"` and summarize it: total
+    import time, the slowest modules (cumulative) and self time per
+    top-level package
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+            modules.append((name, int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue  # header line
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in modules:
+        by_package[name.split(".")[0]] += self_us
+    main_total = next((cum for name, _, cum in modules if name == "main"), None)
+    return {
+        "main_import_ms": main_total / 1000 if main_total else None,
+        "slowest_modules_ms": {
+            name: cum / 1000 for name, _, cum in sorted(modules, key=lambda m: -m[2])[:top]
+        },
+        "packages_self_ms": {
+            pkg: us / 1000 for pkg, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]
+        },
+        "returncode": proc.returncode,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _poll(url: str, deadline: float, want_status: int = 200) -> Optional[float]:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if resp.status == want_status:
+                    return time.perf_counter()
+        except urllib.error.HTTPError as e:
+            if e.code == want_status:
+                return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def serve_timings(timeout: float) -> Dict[str, object]:
+    """Start uvicorn and time /health (port open) and /ready (warm)"""
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        health = _poll(f"http://127.0.0.1:{port}/health", deadline)
+        ready = _poll(f"http://127.0.0.1:{port}/ready", deadline)
+        report: Dict[str, object] = {
+            "health_ms": (health - start) * 1000 if health else None,
+            "ready_ms": (ready - start) * 1000 if ready else None,
+        }
+        if ready:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=5) as resp:
+                report["ready_state"] = json.loads(resp.read())
+        return report
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="modules/packages to list")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for /ready")
+    parser.add_argument("--no-serve", action="store_true", help="only report the import breakdown")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {"imports": import_breakdown(args.top)}
+    if not args.no_serve:
+        report["serve"] = serve_timings(args.timeout)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Wrote startup report to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
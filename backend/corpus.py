@@ -0,0 +1,129 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+# ---------- Configuration ----------
+PDF_BASE_PATH = os.getenv("PDF_BASE_PATH", "./pdfs")
+
+# Names with a meaning of their own in requests ("all" selects the whole corpus)
+RESERVED_NAMES = frozenset({"all"})
+
+# Short names kept for the documents the API has always exposed
+LEGACY_NAMES = {
+    "harness-gear-operation-manual.pdf": "harness_gear",
+    "2920-sp391-sp392-skylight-mesh-fixing-details-with-clip.pdf": "skylight_mesh",
+}
+
+
+def document_name(filename: str) -> str:
+    """Stable API name for a PDF file, e.g. 'Foo Bar-2.pdf' -> 'foo_bar_2'"""
+    if filename in LEGACY_NAMES:
+        return LEGACY_NAMES[filename]
+    stem = os.path.splitext(filename)[0]
+    return re.sub(r"[^a-z0-9]+", "_", stem.lower()).strip("_") or "document"
+
+
+class CorpusRegistry:
+    """
+    Registry of every PDF under base_path, keyed by API name.
+
+    `documents` is copy-on-write: every change builds a new dict and swaps
+    it in, so readers on other threads always see a complete mapping. Read
+    the attribute once per operation rather than keeping a reference.
+    """
+
+    def __init__(self, base_path: str = PDF_BASE_PATH):
+        self.base_path = base_path
+        self.documents: Dict[str, str] = {}
+        # Documents registered by path outside base_path survive rescans
+        self.registered: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def scan(self) -> Dict[str, str]:
+        """Rescan base_path and return the current {name: path} mapping"""
+        found: Dict[str, str] = {}
+        with self._lock:
+            registered_paths = set(self.registered.values())
+        if os.path.isdir(self.base_path):
+            for root, _, files in os.walk(self.base_path):
+                for filename in sorted(files):
+                    if not filename.lower().endswith(".pdf"):
+                        continue
+                    if os.path.join(root, filename) in registered_paths:
+                        continue
+                    name = document_name(filename)
+                    base, n = name, 2
+                    while name in found or name in RESERVED_NAMES:
+                        name, n = f"{base}_{n}", n + 1
+                    found[name] = os.path.join(root, filename)
+        with self._lock:
+            for name, path in self.registered.items():
+                if os.path.exists(path):
+                    found[name] = path
+            self.documents = found
+        return dict(found)
+
+    def check_name(self, name: str, path: str, replace: bool = False) -> None:
+        """
+        Raise ValueError if name is reserved, or FileExistsError if it already
+        names a different file and replace is not set
+        """
+        if name in RESERVED_NAMES:
+            raise ValueError(f"'{name}' is a reserved document name")
+        existing = self.documents.get(name)
+        if existing is not None and not replace and os.path.abspath(existing) != os.path.abspath(path):
+            raise FileExistsError(f"Document '{name}' already exists ({os.path.basename(existing)})")
+
+    def register(self, path: str, name: Optional[str] = None, replace: bool = False) -> str:
+        """
+        Add a PDF by path (keeping it across rescans) and return its name.
+        Taking over another document's name needs replace=True.
+        """
+        name = name or document_name(os.path.basename(path))
+        with self._lock:
+            self.check_name(name, path, replace)
+            for old_name, old_path in list(self.registered.items()):
+                if old_path == path:
+                    del self.registered[old_name]
+            documents = {n: p for n, p in self.documents.items() if p != path}
+            self.registered[name] = path
+            documents[name] = path
+            self.documents = documents
+        return name
+
+    def snapshot(self) -> Dict[str, tuple]:
+        """(mtime, size) per PDF path, for detecting added or changed files"""
+        state = {}
+        with self._lock:
+            paths = list(self.documents.values())
+        if os.path.isdir(self.base_path):
+            for root, _, files in os.walk(self.base_path):
+                paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(".pdf"))
+        for path in set(paths):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def get(self, name: str) -> Optional[str]:
+        """Path of the named document, or None"""
+        return self.documents.get(name)
+
+    def resolve(self, names: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Return {name: path} for the requested names, or every document when
+        names is empty/None or contains "all". Unknown names raise KeyError.
+        """
+        documents = self.documents
+        if not names or "all" in names:
+            return dict(documents)
+        missing = [name for name in names if name not in documents]
+        if missing:
+            raise KeyError(", ".join(missing))
+        return {name: documents[name] for name in names}
+
+
+corpus = CorpusRegistry()
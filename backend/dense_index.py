@@ -0,0 +1,290 @@
+import os
+import json
+import zlib
+import hashlib
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from retrieval import Chunk, IndexCache, tokenize
+
+# ---------- Configuration ----------
+DENSE_INDEX_DIR = os.getenv(
+    "DENSE_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "dense"),
+)
+DENSE_EMBEDDER = os.getenv("DENSE_EMBEDDER", "hashing")
+HASHING_DIM = int(os.getenv("DENSE_HASHING_DIM", "256"))
+# Loaded indexes (memmap + chunk list) kept in memory, least recently used evicted
+DENSE_INDEX_CACHE_MAX_ENTRIES = int(os.getenv("DENSE_INDEX_CACHE_MAX_ENTRIES", "16"))
+INDEX_FORMAT_VERSION = 1
+
+
+# ---------- Embedders ----------
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder (unigrams + bigrams).
+
+    Needs no model download, so it is the default and is what offline tests
+    use. Rows are L2-normalised so a dot product is cosine similarity.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                out[row, h % self.dim] += sign
+        return _normalize(out)
+
+
+class SentenceTransformerEmbedder:
+    """
+    Local sentence-transformers model, loaded on first use
+    """
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = "st-" + model_name.replace("/", "_")
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(vectors.astype(np.float32))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """
+    Return the configured embedder: "hashing" (default) or
+    "sentence-transformers:<model name>". Falls back to hashing if the model
+    cannot be loaded.
+    """
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if DENSE_EMBEDDER.startswith("sentence-transformers:"):
+                model_name = DENSE_EMBEDDER.split(":", 1)[1]
+                try:
+                    _embedder = SentenceTransformerEmbedder(model_name)
+                except Exception as e:
+                    print(f"Embedder '{model_name}' unavailable ({e}), using hashing embedder")
+                    _embedder = HashingEmbedder()
+            else:
+                _embedder = HashingEmbedder()
+        return _embedder
+
+
+# ---------- Dense index ----------
+def _chunk_digest(chunk: Chunk) -> str:
+    return hashlib.sha1(f"{chunk.page}\x00{chunk.text}".encode("utf-8")).hexdigest()
+
+
+class DenseIndex:
+    """
+    Row-aligned embedding matrix for one document's chunks.
+
+    The matrix is a float32 file opened with np.memmap, so it costs no heap
+    and is shared between workers through the OS page cache.
+    """
+
+    def __init__(self, chunks: List[Chunk], matrix: np.ndarray, embedder):
+        self.chunks = chunks
+        self.matrix = matrix
+        self.embedder = embedder
+
+    def search(self, query: str, top_k: int = 8) -> List[Tuple[Chunk, float]]:
+        return self.search_batch([query], top_k)[0]
+
+    def search_batch(self, queries: Sequence[str], top_k: int = 8) -> List[List[Tuple[Chunk, float]]]:
+        """
+        Score all queries in one matrix product and take top_k per query
+        """
+        n = len(self.chunks)
+        if n == 0:
+            return [[] for _ in queries]
+        q = self.embedder.embed(queries)
+        scores = q @ self.matrix.T  # (queries, chunks)
+        k = min(top_k, n)
+        if k < n:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(n), (len(queries), 1))
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates], kind="stable")]
+            results.append([(self.chunks[i], float(scores[row, i])) for i in ordered])
+        return results
+
+
+class DenseIndexStore:
+    """
+    On-disk store of per-document embedding matrices.
+
+    Each document version (extraction key) is a pair of files:
+    <key>.<embedder>.f32 (raw row-major float32) and <key>.<embedder>.json
+    (shape and per-chunk digests). A small <source>.<embedder>.latest file
+    names the current version of each source. When a PDF changes, rows
+    whose chunk digest matches that version are copied over, only new
+    chunks are embedded, and the superseded files are deleted.
+    """
+
+    def __init__(self, index_dir: str = DENSE_INDEX_DIR, max_entries: int = DENSE_INDEX_CACHE_MAX_ENTRIES):
+        self.index_dir = index_dir
+        self._loaded = IndexCache(max_entries, name="dense_index")
+
+    def _paths(self, key: str, embedder) -> Tuple[str, str]:
+        base = os.path.join(self.index_dir, f"{key}.{embedder.name}")
+        return f"{base}.f32", f"{base}.json"
+
+    def _latest_path(self, source: str, embedder) -> str:
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.index_dir, f"source-{digest}.{embedder.name}.latest")
+
+    def get_or_build(self, key: str, source: str, chunks: List[Chunk], embedder=None) -> DenseIndex:
+        embedder = embedder or get_embedder()
+        return self._loaded.get_or_build(f"{key}.{embedder.name}",
+                                         lambda: self._load_or_build(key, source, chunks, embedder))
+
+    def _load_or_build(self, key: str, source: str, chunks: List[Chunk], embedder) -> DenseIndex:
+        matrix_path, meta_path = self._paths(key, embedder)
+        digests = [_chunk_digest(chunk) for chunk in chunks]
+        index = self._open(matrix_path, meta_path, chunks, digests, embedder)
+        if index is None:
+            self._build(key, source, chunks, digests, embedder)
+            index = self._open(matrix_path, meta_path, chunks, digests, embedder)
+        return index
+
+    def _open(self, matrix_path: str, meta_path: str, chunks: List[Chunk], digests: List[str],
+              embedder) -> Optional[DenseIndex]:
+        """
+        Map a stored matrix, but only if its rows were embedded from exactly
+        these chunks: the key does not cover the chunking settings, so a
+        matching row count alone could pair vectors with the wrong chunks
+        """
+        if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            rows, dim = meta["shape"]
+            if meta.get("version") != INDEX_FORMAT_VERSION or rows != len(chunks) or dim != embedder.dim:
+                return None
+            if meta.get("digests") != digests:
+                return None
+            if rows == 0:
+                return DenseIndex(chunks, np.zeros((0, dim), dtype=np.float32), embedder)
+            matrix = np.memmap(matrix_path, dtype=np.float32, mode="r", shape=(rows, dim))
+            return DenseIndex(chunks, matrix, embedder)
+        except Exception as e:
+            print(f"Ignoring unreadable dense index {meta_path}: {e}")
+            return None
+
+    def _read_meta(self, meta_path: str) -> Optional[dict]:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("version") == INDEX_FORMAT_VERSION else None
+
+    def _previous_version(self, source: str, embedder) -> Optional[str]:
+        try:
+            with open(self._latest_path(source, embedder), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _previous_rows(self, previous_key: Optional[str], source: str, embedder) -> Dict[str, np.ndarray]:
+        """Map chunk digest -> vector from the current stored version of source"""
+        if previous_key is None:
+            return {}
+        matrix_path, meta_path = self._paths(previous_key, embedder)
+        meta = self._read_meta(meta_path)
+        if meta is None or meta.get("source") != source:
+            return {}
+        rows, dim = meta["shape"]
+        if rows == 0 or dim != embedder.dim:
+            return {}
+        try:
+            matrix = np.memmap(matrix_path, dtype=np.float32, mode="r", shape=(rows, dim))
+        except (OSError, ValueError):
+            return {}
+        return {digest: np.array(matrix[i]) for i, digest in enumerate(meta["digests"])}
+
+    def _remove_version(self, key: str, source: str, embedder) -> None:
+        """Delete a superseded version's files (open memmaps stay valid)"""
+        matrix_path, meta_path = self._paths(key, embedder)
+        meta = self._read_meta(meta_path)
+        if meta is not None and meta.get("source") != source:
+            return  # identical content registered under another source still uses it
+        for path in (meta_path, matrix_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _build(self, key: str, source: str, chunks: List[Chunk], digests: List[str], embedder) -> None:
+        matrix_path, meta_path = self._paths(key, embedder)
+        previous_key = self._previous_version(source, embedder)
+        previous = self._previous_rows(previous_key, source, embedder)
+        matrix = np.zeros((len(chunks), embedder.dim), dtype=np.float32)
+
+        missing = [i for i, digest in enumerate(digests) if digest not in previous]
+        for i, digest in enumerate(digests):
+            if digest in previous:
+                matrix[i] = previous[digest]
+        if missing:
+            matrix[missing] = embedder.embed([chunks[i].text for i in missing])
+        print(f"Dense index for {os.path.basename(source)}: embedded {len(missing)}, "
+              f"reused {len(chunks) - len(missing)} chunks")
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_matrix = f"{matrix_path}.{os.getpid()}.tmp"
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        matrix.tofile(tmp_matrix)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_FORMAT_VERSION,
+                "source": source,
+                "embedder": embedder.name,
+                "shape": [len(chunks), embedder.dim],
+                "digests": digests,
+            }, f)
+        os.replace(tmp_matrix, matrix_path)
+        os.replace(tmp_meta, meta_path)
+
+        latest_path = self._latest_path(source, embedder)
+        tmp_latest = f"{latest_path}.{os.getpid()}.tmp"
+        with open(tmp_latest, "w", encoding="utf-8") as f:
+            f.write(key)
+        os.replace(tmp_latest, latest_path)
+        if previous_key is not None and previous_key != key:
+            self._remove_version(previous_key, source, embedder)
+
+    def clear(self) -> None:
+        self._loaded.clear()
+
+
+dense_indexes = DenseIndexStore()
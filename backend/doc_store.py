@@ -0,0 +1,91 @@
+import os
+import mmap
+import sys
+import struct
+from collections.abc import Sequence
+from typing import Iterable, List, Union
+
+# ---------- File format ----------
+# One file per extracted document:
+#   header   MAGIC (8 bytes) | version (u32) | page count N (u32)
+#   offsets  N + 1 little-endian u64 byte offsets into the blob area
+#   blobs    UTF-8 page texts, back to back
+# Page i is blob[offsets[i]:offsets[i + 1]].
+MAGIC = b"PDFQAPG\x00"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sII")
+
+
+def write_pages(path: str, pages: Iterable[str]) -> None:
+    """Write pages to `path` atomically in the mapped page-store format"""
+    blobs = [text.encode("utf-8") for text in pages]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(blobs)))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class MappedPages(Sequence):
+    """
+    Read-only page list backed by a memory-mapped page-store file.
+
+    Nothing is read up front: the OS pages the file in on access and shares
+    those pages between every process that maps the same file, so N uvicorn
+    workers cost one copy of the text instead of N. Indexing decodes one
+    page's UTF-8 slice; raw() returns the bytes as a zero-copy memoryview.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} page store")
+        self._count = count
+        self._view = memoryview(self._map)
+        offsets = self._view[_HEADER.size:_HEADER.size + 8 * (count + 1)]
+        # The offsets are little-endian; cast() reads native order
+        self._offsets = offsets.cast("Q") if sys.byteorder == "little" else \
+            struct.unpack(f"<{count + 1}Q", offsets)
+        self._blob_start = _HEADER.size + 8 * (count + 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _span(self, index: int):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("page index out of range")
+        return self._blob_start + self._offsets[index], self._blob_start + self._offsets[index + 1]
+
+    def raw(self, index: int) -> memoryview:
+        start, stop = self._span(index)
+        return self._view[start:stop]
+
+    def byte_size(self, index: int) -> int:
+        start, stop = self._span(index)
+        return stop - start
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        start, stop = self._span(index)
+        # Decode straight from the mapping; no intermediate bytes copy
+        return str(self._view[start:stop], "utf-8")
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def __repr__(self) -> str:
+        return f"MappedPages({self.path!r}, pages={self._count})"
@@ -0,0 +1,167 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from corpus import corpus
+from pdf_qa import get_corpus_index, get_dense_index, get_pdf_index
+from retrieval import DEFAULT_RETRIEVAL_MODE
+from workers import run_in_worker
+
+# ---------- Configuration ----------
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Seconds between PDF_BASE_PATH polls; 0 disables the watcher
+INGEST_WATCH_INTERVAL = float(os.getenv("INGEST_WATCH_INTERVAL", "10"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "500"))
+
+
+class IngestionJob:
+    def __init__(self, name: str, path: str, reason: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.path = path
+        self.reason = reason
+        self.status = "queued"  # queued | running | done | failed
+        self.error: Optional[str] = None
+        self.chunks: Optional[int] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "filename": os.path.basename(self.path),
+            "reason": self.reason,
+            "status": self.status,
+            "error": self.error,
+            "chunks": self.chunks,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": (self.finished_at - self.started_at)
+            if self.finished_at and self.started_at else None,
+        }
+
+
+def ingest_document(path: str, ocr_method: str = "pymupdf") -> int:
+    """
+    Extract, chunk and index one PDF so queries find warm caches; returns
+    the number of chunks indexed
+    """
+    index = get_pdf_index(path, ocr_method)
+    if index is None:
+        raise ValueError("Could not extract any text from PDF")
+    if DEFAULT_RETRIEVAL_MODE in ("dense", "hybrid"):
+        get_dense_index(path, ocr_method)
+    return len(index.chunks)
+
+
+class IngestionQueue:
+    """
+    Background ingestion off the request path.
+
+    Jobs are drained by INGEST_WORKERS asyncio tasks that run the blocking
+    work on the shared worker pool. A watcher task polls PDF_BASE_PATH and
+    queues new or changed PDFs. Once the queue drains, the merged corpus
+    index is rebuilt so "all" queries stay warm too.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, watch_interval: float = INGEST_WATCH_INTERVAL):
+        self.workers = workers
+        self.watch_interval = watch_interval
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[str, IngestionJob] = {}
+        self._snapshot: Dict[str, tuple] = {}
+
+    async def start(self) -> None:
+        self._snapshot = await run_in_worker(corpus.snapshot)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(max(1, self.workers))]
+        for name, path in list(corpus.documents.items()):
+            self.submit(name, path, "startup")
+        if self.watch_interval > 0:
+            self._tasks.append(asyncio.create_task(self._watch()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, name: str, path: str, reason: str = "manual") -> IngestionJob:
+        """Queue a document, reusing the queued job if one is already pending"""
+        pending = self._pending.get(path)
+        if pending is not None and pending.status == "queued":
+            return pending
+        job = IngestionJob(name, path, reason)
+        self.jobs[job.id] = job
+        while len(self.jobs) > INGEST_JOB_HISTORY:
+            self.jobs.popitem(last=False)
+        self._pending[path] = job
+        try:
+            st = os.stat(path)
+            self._snapshot[path] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        self._queue.put_nowait(job)
+        return job
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def join(self) -> None:
+        """Wait until every queued job (and the corpus index rebuild) is done"""
+        await self._queue.join()
+
+    async def rescan(self, reason: str = "rescan") -> List[IngestionJob]:
+        """Rescan PDF_BASE_PATH and queue documents that are new or changed"""
+        await run_in_worker(corpus.scan)
+        snapshot = await run_in_worker(corpus.snapshot)
+        jobs = []
+        for name, path in list(corpus.documents.items()):
+            if snapshot.get(path) != self._snapshot.get(path):
+                jobs.append(self.submit(name, path, reason))
+        self._snapshot = snapshot
+        return jobs
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                jobs = await self.rescan("watch")
+                if jobs:
+                    print(f"Watcher queued {len(jobs)} new or changed PDFs")
+            except Exception as e:
+                print(f"PDF watcher error: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.chunks = await run_in_worker(ingest_document, job.path)
+                job.status = "done"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"Ingestion of {job.path} failed: {e}")
+            finally:
+                job.finished_at = time.time()
+                if self._pending.get(job.path) is job:
+                    del self._pending[job.path]
+
+            if self._queue.empty() and corpus.documents:
+                try:
+                    await run_in_worker(get_corpus_index, list(corpus.documents.values()), "pymupdf")
+                except Exception as e:
+                    print(f"Corpus index rebuild failed: {e}")
+            self._queue.task_done()
+
+
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,558 @@
+import os
+import time
+import random
+import asyncio
+import inspect
+import threading
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from metrics import LLM_CALLS, record_llm_usage, stage
+from token_budget import count_tokens
+from workers import run_in_worker
+
+# ---------- Configuration ----------
+# Failover order, e.g. "azure,local,mock"; mock is used when nothing else can be set up
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "azure")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Requests / tokens per minute per backend (0 = unlimited)
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "20"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+# Ask for response_format=json_object on JSON prompts; switched off per backend
+# if the model rejects it
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "1").lower() in ("1", "true", "yes")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """Every backend failed or is throttled; retry_after is a hint in seconds"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ---------- Rate limiting ----------
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at per_minute / 60 per second.
+
+    reserve() takes tokens immediately (the balance may go negative) and
+    returns how long the caller must wait before using them, so concurrent
+    callers queue up in order instead of polling. try_take() is the
+    non-blocking form for shedding load. per_minute=0 disables it; capacity
+    (the burst size) defaults to one minute's worth.
+    """
+
+    def __init__(self, per_minute: int, capacity: Optional[float] = None):
+        self.capacity = float(capacity or per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_take(self, amount: float) -> float:
+        """Take tokens if available and return 0, else take none and return the wait"""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def refund(self, amount: float) -> None:
+        if not self.rate or amount <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# ---------- Backends ----------
+class MockClient:
+    CONTENT = '{"answer": "Mock response - please configure Azure OpenAI credentials", "confidence": 0.5, "language": "en", "citations": []}'
+
+    class Chat:
+        class Completions:
+            def create(self, **kwargs):
+                class MockResponse:
+                    def __init__(self):
+                        self.choices = [MockChoice()]
+                class MockChoice:
+                    def __init__(self):
+                        self.message = MockMessage()
+                class MockMessage:
+                    def __init__(self):
+                        self.content = MockClient.CONTENT
+                if kwargs.get("stream"):
+                    return self._stream(MockClient.CONTENT)
+                return MockResponse()
+
+            def _stream(self, content: str, piece: int = 8):
+                """Yield chunks shaped like chat.completions stream events"""
+                class MockDelta:
+                    def __init__(self, text):
+                        self.content = text
+                class MockStreamChoice:
+                    def __init__(self, text):
+                        self.delta = MockDelta(text)
+                class MockChunk:
+                    def __init__(self, text):
+                        self.choices = [MockStreamChoice(text)]
+                for i in range(0, len(content), piece):
+                    yield MockChunk(content[i:i + piece])
+
+        def __init__(self):
+            self.completions = self.Completions()
+
+    def __init__(self):
+        self.chat = self.Chat()
+
+
+class LLMBackend:
+    """
+    One chat-completions endpoint with its own rate limits and concurrency
+    cap. Subclasses provide the sync and async clients.
+    """
+
+    name = "base"
+
+    def __init__(self, model: str, rpm: int = LLM_RPM, tpm: int = LLM_TPM,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.blocked_until = 0.0  # monotonic time until which a 429 told us to back off
+        self.json_mode = LLM_JSON_MODE
+        # Ask streams for a final usage chunk; switched off if the API rejects it
+        self.stream_usage = True
+        self._sync_slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+
+    def async_slots(self) -> asyncio.Semaphore:
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        return self._async_slots
+
+    def reserve(self, tokens: int) -> float:
+        """Take one request and `tokens` from the buckets; return the wait in seconds"""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        return max(wait, self.blocked_until - time.monotonic())
+
+    def refund(self, tokens: int) -> None:
+        """Give back the tokens reserved for an attempt that failed"""
+        self.tokens.refund(tokens)
+
+    def create(self, messages: List[Dict[str, str]], max_tokens: int, stream: bool = False,
+               json_mode: bool = False):
+        raise NotImplementedError
+
+    async def acreate(self, messages: List[Dict[str, str]], max_tokens: int, stream: bool = False,
+                      json_mode: bool = False):
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any server speaking the OpenAI chat-completions API (vLLM, llama.cpp,
+    Ollama, LM Studio, ...). SDK-level retries are disabled because
+    LLMRouter retries with its own backoff and failover.
+    """
+
+    name = "local"
+
+    def __init__(self, base_url: str, model: str, api_key: str = "not-needed", **kwargs):
+        super().__init__(model, **kwargs)
+        self.base_url = base_url
+        self.api_key = api_key
+        self._client = None
+        self._async_client = None
+
+    def _client_kwargs(self) -> dict:
+        return {"api_key": self.api_key, "base_url": self.base_url}
+
+    def _make_client(self, async_client: bool, **kwargs):
+        import openai
+
+        cls = openai.AsyncOpenAI if async_client else openai.OpenAI
+        return cls(**self._client_kwargs(), max_retries=0, timeout=LLM_REQUEST_TIMEOUT, **kwargs)
+
+    def sync_client(self):
+        if self._client is None:
+            self._client = self._make_client(async_client=False)
+        return self._client
+
+    def async_client(self):
+        """Async client sharing one pooled keep-alive HTTP connection pool"""
+        if self._async_client is None:
+            import httpx
+
+            self._async_client = self._make_client(
+                async_client=True,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                    ),
+                    timeout=LLM_REQUEST_TIMEOUT,
+                ),
+            )
+        return self._async_client
+
+    def _params(self, messages, max_tokens, stream, json_mode) -> dict:
+        params = {"model": self.model, "messages": messages, "temperature": 0.1, "max_tokens": max_tokens}
+        if stream:
+            params["stream"] = True
+            if self.stream_usage:
+                params["stream_options"] = {"include_usage": True}
+        if json_mode and self.json_mode:
+            params["response_format"] = {"type": "json_object"}
+        return params
+
+    def create(self, messages, max_tokens, stream=False, json_mode=False):
+        return self.sync_client().chat.completions.create(
+            **self._params(messages, max_tokens, stream, json_mode))
+
+    async def acreate(self, messages, max_tokens, stream=False, json_mode=False):
+        return await self.async_client().chat.completions.create(
+            **self._params(messages, max_tokens, stream, json_mode))
+
+    async def close(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+
+class AzureOpenAIBackend(OpenAICompatibleBackend):
+    name = "azure"
+
+    def __init__(self, endpoint: str, api_key: str, deployment: str, api_version: str, **kwargs):
+        super().__init__(base_url=endpoint, model=deployment, api_key=api_key, **kwargs)
+        self.api_version = api_version
+
+    def _client_kwargs(self) -> dict:
+        return {"api_key": self.api_key, "api_version": self.api_version, "azure_endpoint": self.base_url}
+
+    def _make_client(self, async_client: bool, **kwargs):
+        import openai
+
+        cls = openai.AsyncAzureOpenAI if async_client else openai.AzureOpenAI
+        return cls(**self._client_kwargs(), max_retries=0, timeout=LLM_REQUEST_TIMEOUT, **kwargs)
+
+
+class MockBackend(LLMBackend):
+    """In-process mock; the async path runs the sync client on the worker pool"""
+
+    name = "mock"
+
+    def __init__(self, client: Optional[MockClient] = None):
+        super().__init__("mock-deployment", rpm=0, tpm=0)
+        self.client = client or MockClient()
+
+    def create(self, messages, max_tokens, stream=False, json_mode=False):
+        return self.client.chat.completions.create(
+            model=self.model, messages=messages, max_tokens=max_tokens, stream=stream
+        )
+
+    async def acreate(self, messages, max_tokens, stream=False, json_mode=False):
+        if stream:
+            # The mock stream is in-memory, so iterating it inline is fine
+            return _aiter(self.create(messages, max_tokens, stream=True))
+        return await run_in_worker(self.create, messages, max_tokens)
+
+
+async def _aiter(iterator: Iterator):
+    for item in iterator:
+        yield item
+
+
+async def _close_stream(stream) -> None:
+    """Close an SDK stream (close()) or async generator (aclose())"""
+    close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+    if close is not None:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
+
+def make_backend(kind: str) -> LLMBackend:
+    """Build one backend from environment configuration"""
+    if kind == "azure":
+        api_key = os.getenv("AZURE_OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("AZURE_OPENAI_API_KEY is not set")
+        backend = AzureOpenAIBackend(
+            endpoint=os.getenv("AZURE_OPENAI_ENDPOINT", "https://azureaitestenv.cognitiveservices.azure.com/"),
+            api_key=api_key,
+            deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01"),
+        )
+    elif kind == "local":
+        base_url = os.getenv("LOCAL_LLM_BASE_URL")
+        if not base_url:
+            raise ValueError("LOCAL_LLM_BASE_URL is not set")
+        return OpenAICompatibleBackend(
+            base_url=base_url,
+            model=os.getenv("LOCAL_LLM_MODEL", "local-model"),
+            api_key=os.getenv("LOCAL_LLM_API_KEY", "not-needed"),
+            rpm=int(os.getenv("LOCAL_LLM_RPM", "0")),
+            tpm=int(os.getenv("LOCAL_LLM_TPM", "0")),
+        )
+    elif kind == "mock":
+        return MockBackend()
+    else:
+        raise ValueError(f"Unknown LLM backend '{kind}'")
+    # Creating the sync client validates the SDK install and credentials up front
+    backend.sync_client()
+    return backend
+
+
+# ---------- Router: limits, retries, failover ----------
+def is_retryable(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Connection errors and timeouts carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectError",
+                                    "ReadTimeout", "ConnectTimeout", "RemoteProtocolError")
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Server-suggested delay from Retry-After / retry-after-ms headers"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def backoff_delay(attempt: int, error: BaseException) -> float:
+    """Full-jitter exponential backoff, never shorter than Retry-After"""
+    delay = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+    suggested = retry_after_seconds(error)
+    return max(delay, suggested or 0.0)
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    return sum(count_tokens(m["content"]) + 4 for m in messages) + max_tokens
+
+
+class LLMRouter:
+    """
+    Sends chat completions to the first healthy backend in failover order.
+
+    Per backend: requests/tokens-per-minute buckets and a concurrency cap
+    gate each call; retryable errors (429, 5xx, timeouts) are retried with
+    jittered exponential backoff honouring Retry-After, and a 429 pauses the
+    backend for other callers too. When a backend's retries are exhausted
+    the next backend is tried; if all fail, LLMUnavailableError is raised.
+    """
+
+    def __init__(self, backends: List[LLMBackend]):
+        self.backends = backends
+
+    @property
+    def primary(self) -> LLMBackend:
+        return self.backends[0]
+
+    def _json_mode_rejected(self, backend: LLMBackend, error: BaseException, json_mode: bool) -> bool:
+        """Turn JSON mode off for a backend whose model rejects response_format"""
+        if json_mode and backend.json_mode and getattr(error, "status_code", None) == 400 \
+                and "response_format" in str(error):
+            print(f"LLM backend '{backend.name}' does not support JSON mode; disabling it")
+            backend.json_mode = False
+            return True
+        return False
+
+    def _stream_usage_rejected(self, backend: LLMBackend, error: BaseException) -> bool:
+        """Stop asking for stream usage on a backend whose API version rejects stream_options"""
+        if backend.stream_usage and getattr(error, "status_code", None) == 400 \
+                and "stream_options" in str(error):
+            print(f"LLM backend '{backend.name}' does not report stream usage; estimating it")
+            backend.stream_usage = False
+            return True
+        return False
+
+    def _on_error(self, backend: LLMBackend, error: BaseException, attempt: int) -> Optional[float]:
+        """Return the delay before retrying, or None to give up on this backend"""
+        if not is_retryable(error) or attempt >= LLM_MAX_RETRIES:
+            LLM_CALLS.inc(backend=backend.name, outcome="error")
+            return None
+        LLM_CALLS.inc(backend=backend.name, outcome="retry")
+        delay = backoff_delay(attempt, error)
+        if getattr(error, "status_code", None) == 429:
+            backend.blocked_until = max(backend.blocked_until, time.monotonic() + delay)
+        return delay
+
+    def _unavailable(self, errors: List[str]) -> LLMUnavailableError:
+        now = time.monotonic()
+        waits = [b.blocked_until - now for b in self.backends if b.blocked_until > now]
+        return LLMUnavailableError("All LLM backends failed: " + "; ".join(errors),
+                                   retry_after=min(waits) if waits else None)
+
+    def _settle(self, backend: LLMBackend, estimate: int, resp) -> Tuple[str, object]:
+        usage = getattr(resp, "usage", None)
+        record_llm_usage(usage)
+        total = getattr(usage, "total_tokens", None)
+        if total:
+            backend.tokens.refund(estimate - total)
+        LLM_CALLS.inc(backend=backend.name, outcome="ok")
+        return resp.choices[0].message.content.strip(), usage
+
+    def _settle_stream(self, backend: LLMBackend, messages: List[Dict[str, str]], estimate: int,
+                       usage, parts: List[str]) -> None:
+        if usage is None:
+            # No usage chunk from this API version: count locally
+            usage = SimpleNamespace(
+                prompt_tokens=sum(count_tokens(m["content"]) + 4 for m in messages),
+                completion_tokens=count_tokens("".join(parts)),
+            )
+            usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        record_llm_usage(usage)
+        total = getattr(usage, "total_tokens", None)
+        if total:
+            backend.tokens.refund(estimate - total)
+        LLM_CALLS.inc(backend=backend.name, outcome="ok")
+
+    def complete_sync(self, messages: List[Dict[str, str]], max_tokens: int, json_mode: bool = False) -> str:
+        estimate = estimate_tokens(messages, max_tokens)
+        errors = []
+        for backend in self.backends:
+            attempt = 0
+            while True:
+                time.sleep(backend.reserve(estimate))
+                try:
+                    with backend._sync_slots, stage("llm"):
+                        resp = backend.create(messages, max_tokens, json_mode=json_mode)
+                    return self._settle(backend, estimate, resp)[0]
+                except Exception as e:
+                    backend.refund(estimate)
+                    if self._json_mode_rejected(backend, e, json_mode):
+                        continue
+                    delay = self._on_error(backend, e, attempt)
+                    if delay is None:
+                        errors.append(f"{backend.name}: {e}")
+                        break
+                    time.sleep(delay)
+                    attempt += 1
+        raise self._unavailable(errors)
+
+    async def complete(self, messages: List[Dict[str, str]], max_tokens: int, json_mode: bool = False) -> str:
+        estimate = estimate_tokens(messages, max_tokens)
+        errors = []
+        for backend in self.backends:
+            attempt = 0
+            while True:
+                await asyncio.sleep(backend.reserve(estimate))
+                try:
+                    async with backend.async_slots():
+                        with stage("llm"):
+                            resp = await backend.acreate(messages, max_tokens, json_mode=json_mode)
+                    return self._settle(backend, estimate, resp)[0]
+                except Exception as e:
+                    backend.refund(estimate)
+                    if self._json_mode_rejected(backend, e, json_mode):
+                        continue
+                    delay = self._on_error(backend, e, attempt)
+                    if delay is None:
+                        errors.append(f"{backend.name}: {e}")
+                        break
+                    await asyncio.sleep(delay)
+                    attempt += 1
+        raise self._unavailable(errors)
+
+    async def stream(self, messages: List[Dict[str, str]], max_tokens: int,
+                     json_mode: bool = False) -> AsyncIterator[str]:
+        """
+        Yield completion deltas. Retries and failover apply until the first
+        delta arrives; after that, errors propagate to the caller.
+        """
+        estimate = estimate_tokens(messages, max_tokens)
+        errors = []
+        for backend in self.backends:
+            attempt = 0
+            while True:
+                await asyncio.sleep(backend.reserve(estimate))
+                started = False
+                try:
+                    async with backend.async_slots():
+                        stream = await backend.acreate(messages, max_tokens, stream=True, json_mode=json_mode)
+                        usage = None
+                        parts = []
+                        try:
+                            async for chunk in stream:
+                                if getattr(chunk, "usage", None):
+                                    usage = chunk.usage
+                                if chunk.choices and chunk.choices[0].delta.content:
+                                    started = True
+                                    parts.append(chunk.choices[0].delta.content)
+                                    yield chunk.choices[0].delta.content
+                        finally:
+                            # Return the pooled connection even if the consumer gave up
+                            await _close_stream(stream)
+                    self._settle_stream(backend, messages, estimate, usage, parts)
+                    return
+                except Exception as e:
+                    if started:
+                        LLM_CALLS.inc(backend=backend.name, outcome="error")
+                        raise
+                    backend.refund(estimate)
+                    if self._json_mode_rejected(backend, e, json_mode) or self._stream_usage_rejected(backend, e):
+                        continue
+                    delay = self._on_error(backend, e, attempt)
+                    if delay is None:
+                        errors.append(f"{backend.name}: {e}")
+                        break
+                    await asyncio.sleep(delay)
+                    attempt += 1
+        raise self._unavailable(errors)
+
+    async def close(self) -> None:
+        for backend in self.backends:
+            await backend.close()
+
+
+def setup_llm_router(order: str = LLM_BACKENDS) -> LLMRouter:
+    """Build the router from LLM_BACKENDS, skipping backends that cannot be set up"""
+    backends = []
+    for kind in [k.strip() for k in order.split(",") if k.strip()]:
+        try:
+            backends.append(make_backend(kind))
+        except Exception as e:
+            print(f"LLM backend '{kind}' setup failed: {e}")
+    if not backends:
+        print("Using mock client for demonstration...")
+        backends.append(MockBackend())
+    return LLMRouter(backends)
@@ -1,22 +1,53 @@
+import time
+
+# Measured from here so /ready can report the import share of startup
+_IMPORT_START = time.perf_counter()
+
 import os
-import json
-import concurrent.futures
-from typing import Optional, List, Dict
-from fastapi import FastAPI, HTTPException
+import asyncio
+from typing import Optional, List, Dict, Tuple, Union
+import re
+import math
+import uuid
+from contextlib import AsyncExitStack, contextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from pdf_qa import pdf_qa, extract_pdf_text_per_page
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from pdf_qa import (pdf_qa_async, inspect_pdf_pages, close_llm_clients, answer_cache_scope, get_llm,
+                    preload_pdf_engine, get_pdf_pages, citation_pages,
+                    build_qa_prompt, stream_azure_openai_async, pdf_qa_batch_async, MAX_PACK_SIZE)
+from corpus import corpus, document_name
+from ingestion import ingestion_queue
+from llm_backends import LLMUnavailableError
+from admission import BATCH, INTERACTIVE, AdmissionRejected, admission, client_key
+from answer_parsing import VALIDATE_CITATIONS, parse_json_answer, validate_citations
+from pdf_cache import extraction_cache
+from ocr import ocr_cache
+from metrics import (REQUEST_SECONDS, STAGE_SECONDS, TIMING_HEADERS, end_request_timings, register_cache,
+                     render_metrics, server_timing_header, stage, start_request_timings)
+from streaming import AnswerStreamExtractor, ndjson_line
+from token_budget import get_tokenizer_error, load_tokenizer
+from answer_cache import answer_cache
+from workers import run_in_worker, shutdown_worker_pool
+from retrieval import DEFAULT_RETRIEVAL_MODE, DEFAULT_TOP_K, bm25_indexes, corpus_indexes
 
 # Pydantic models for request/response
 class QuestionRequest(BaseModel):
     question: str
-    pdf: str = "harness_gear"
+    pdf: str = "harness_gear"  # a document name, a path, or "all"
+    pdfs: Optional[List[str]] = None  # subset of document names for corpus mode
     ocr_method: str = "pymupdf"
     format: str = "json"
+    top_k: Optional[int] = DEFAULT_TOP_K
+    retrieval_mode: str = DEFAULT_RETRIEVAL_MODE
+    use_cache: bool = True
 
 class Citation(BaseModel):
     page: int
     quote: str
+    document: Optional[str] = None
+    verified: Optional[bool] = None  # quote found on the cited page (None: not checked)
 
 class QuestionResponse(BaseModel):
     success: bool
@@ -28,6 +59,25 @@ class QuestionResponse(BaseModel):
     language: Optional[str] = None
     citations: Optional[List[Citation]] = None
     format: Optional[str] = None
+    cache_hit: bool = False
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    pdf: str = "harness_gear"
+    ocr_method: str = "pymupdf"
+    format: str = "json"
+    top_k: Optional[int] = DEFAULT_TOP_K
+    retrieval_mode: str = DEFAULT_RETRIEVAL_MODE
+    use_cache: bool = True
+    concurrency: int = 4
+    pack_size: int = Field(1, ge=1, le=MAX_PACK_SIZE)  # bounded by the completion/context budget
+    stream: bool = False
+
+class BatchQuestionResponse(BaseModel):
+    success: bool
+    pdf: str
+    total_count: int
+    results: List[QuestionResponse]
 
 class HealthResponse(BaseModel):
     status: str
@@ -44,11 +94,34 @@ class PDFListResponse(BaseModel):
     available_pdfs: Dict[str, PDFInfo]
     total_count: int
 
+class RegisterPDFRequest(BaseModel):
+    path: str
+    name: Optional[str] = None
+    replace: bool = False  # allow taking over an existing document name
+
+class IngestionJobInfo(BaseModel):
+    id: str
+    name: str
+    filename: str
+    reason: str
+    status: str
+    error: Optional[str] = None
+    chunks: Optional[int] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    duration_seconds: Optional[float] = None
+
+class IngestionJobList(BaseModel):
+    queue_depth: int
+    jobs: List[IngestionJobInfo]
+
 class PDFInspectionResponse(BaseModel):
     pdf_name: str
     filename: str
     total_pages: int
-    total_characters: int
+    total_characters: Optional[int] = None  # None until the PDF has been fully extracted
+    content_bytes: Optional[int] = None
     preview_pages: List[Dict]
 
 # Create FastAPI app
@@ -70,12 +143,114 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# PDF paths configuration
-PDF_BASE_PATH = os.getenv("PDF_BASE_PATH", "./pdfs")
-AVAILABLE_PDFS = {
-    "harness_gear": os.path.join(PDF_BASE_PATH, "harness-gear-operation-manual.pdf"),
-    "skylight_mesh": os.path.join(PDF_BASE_PATH, "2920-sp391-sp392-skylight-mesh-fixing-details-with-clip.pdf")
-}
+# Metrics: per-request stage timings and Prometheus-style /metrics
+register_cache("extraction", extraction_cache)
+register_cache("index", bm25_indexes)
+register_cache("corpus_index", corpus_indexes)
+register_cache("answer", answer_cache)
+register_cache("ocr", ocr_cache)
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Record request latency and, if enabled, return per-stage Server-Timing"""
+    timings, token = start_request_timings()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        end_request_timings(token)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(time.perf_counter() - start,
+                            route=getattr(route, "path", "unmatched"), status=response.status_code)
+    if TIMING_HEADERS and timings:
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+# PDF paths configuration: every PDF under PDF_BASE_PATH, scanned at startup.
+# The registry swaps in a new mapping on rescan, so always read it from corpus.
+PDF_BASE_PATH = corpus.base_path
+
+# Request timeouts (seconds)
+ASK_TIMEOUT = float(os.getenv("ASK_TIMEOUT_SECONDS", "60"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+INSPECT_TIMEOUT = float(os.getenv("INSPECT_TIMEOUT_SECONDS", "30"))
+
+# Uploads larger than this are rejected with 413
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "100"))
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
+
+# /health is liveness; /ready returns 200 once the background preload is done
+READY_WAIT_FOR_INGESTION = os.getenv("READY_WAIT_FOR_INGESTION", "1").lower() in ("1", "true", "yes")
+# A failed preload step is retried in the background with doubling backoff,
+# capped at PRELOAD_RETRY_MAX_SECONDS, until it succeeds; /ready stays 503
+# (reporting the error) meanwhile
+PRELOAD_RETRY_SECONDS = float(os.getenv("PRELOAD_RETRY_SECONDS", "2"))
+PRELOAD_RETRY_MAX_SECONDS = float(os.getenv("PRELOAD_RETRY_MAX_SECONDS", "60"))
+startup_state = {"ready": False, "import_seconds": IMPORT_SECONDS, "preload_seconds": {},
+                 "startup_seconds": None, "tokenizer": None, "tokenizer_error": None, "error": None}
+
+async def preload():
+    """
+    Warm everything the first request would otherwise pay for: the corpus
+    scan, PyMuPDF, the LLM client, the tokenizer and (by default) extraction and indexes
+    for every document, served from the on-disk caches when warm. /ready only
+    turns 200 once every step has succeeded; failed steps are retried.
+    """
+    async def step(name, start_step):
+        start = time.perf_counter()
+        delay = PRELOAD_RETRY_SECONDS
+        attempt = 1
+        while True:
+            try:
+                result = await start_step()
+                break
+            except Exception as e:
+                startup_state["error"] = f"{name} (attempt {attempt}): {e}"
+                print(f"Preload step {name} failed (attempt {attempt}), retrying in {delay:g}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, PRELOAD_RETRY_MAX_SECONDS)
+            attempt += 1
+        startup_state["preload_seconds"][name] = time.perf_counter() - start
+        startup_state["error"] = None
+        return result
+
+    await step("corpus_scan", lambda: run_in_worker(corpus.scan))
+    await step("ingestion_start", ingestion_queue.start)
+    await step("pdf_engine", lambda: run_in_worker(preload_pdf_engine))
+    await step("llm_client", lambda: run_in_worker(get_llm))
+    # Never fails: without the BPE file token counts fall back to the estimate
+    startup_state["tokenizer"] = await step("tokenizer", lambda: run_in_worker(load_tokenizer))
+    startup_state["tokenizer_error"] = get_tokenizer_error()
+    if READY_WAIT_FOR_INGESTION:
+        await step("ingestion", ingestion_queue.join)
+    startup_state["ready"] = True
+    startup_state["startup_seconds"] = time.perf_counter() - _IMPORT_START
+    print(f"Ready after {startup_state['startup_seconds']:.2f}s (imports {IMPORT_SECONDS:.2f}s)")
+
+@app.on_event("startup")
+async def startup():
+    """
+    Start preloading in the background and return immediately, so uvicorn
+    binds the port (and /health answers) before any heavy work runs
+    """
+    app.state.preload_task = asyncio.create_task(preload())
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop ingestion, release the shared worker pool and pooled LLM connections"""
+    preload_task = getattr(app.state, "preload_task", None)
+    if preload_task is not None:
+        preload_task.cancel()
+    await ingestion_queue.stop()
+    shutdown_worker_pool()
+    await close_llm_clients()
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until caches, indexes and the LLM client are warm"""
+    body = dict(startup_state, pending_ingestion=ingestion_queue.queue_depth())
+    return JSONResponse(body, status_code=200 if startup_state["ready"] else 503)
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -83,83 +258,185 @@ async def health_check():
     return HealthResponse(
         status="healthy",
         message="PDF QA FastAPI is running",
-        available_pdfs=list(AVAILABLE_PDFS.keys()),
-        ocr_methods=["pymupdf", "pdf2image", "no_ocr"]
+        available_pdfs=list(corpus.documents),
+        ocr_methods=["pymupdf", "parallel", "ocr", "pdf2image", "no_ocr"]
     )
 
-@app.post("/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
+def resolve_pdf_path(pdf: str) -> str:
     """
-    Ask questions about PDF documents with OCR support
+    Map a PDF name (or path) to an existing file, raising 404 otherwise
     """
+    # Determine PDF path
+    pdf_path = corpus.get(pdf) or pdf
+    
+    # Check if PDF exists
+    if not os.path.exists(pdf_path):
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": f"PDF not found: {pdf_path}",
+                "available_pdfs": list(corpus.documents)
+            }
+        )
+    return pdf_path
+
+def resolve_target(request: QuestionRequest) -> Tuple[Union[str, List[str]], str]:
+    """
+    Return (pdf path or list of paths, response label) for a question.
+    pdf="all" or a non-empty `pdfs` list selects corpus mode.
+    """
+    if request.pdf != "all" and not request.pdfs:
+        pdf_path = resolve_pdf_path(request.pdf)
+        return pdf_path, os.path.basename(pdf_path)
     try:
-        # Determine PDF path
-        if request.pdf in AVAILABLE_PDFS:
-            pdf_path = AVAILABLE_PDFS[request.pdf]
-        else:
-            pdf_path = request.pdf
-        
-        # Check if PDF exists
-        if not os.path.exists(pdf_path):
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error": f"PDF not found: {pdf_path}",
-                    "available_pdfs": list(AVAILABLE_PDFS.keys())
-                }
-            )
-        
-        # Process the question (run in thread to avoid blocking)
-        def process_question():
-            return pdf_qa(pdf_path, request.question, 
-                         format_type=request.format, 
-                         ocr_method=request.ocr_method)
-        
-        # Run in executor to avoid blocking
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(process_question)
-            answer = future.result(timeout=60)  # 60 second timeout
-        
-        # Parse answer if JSON format
-        if request.format == "json":
-            try:
-                parsed_answer = json.loads(answer)
-                citations = [
-                    Citation(page=cite.get('page', 0), quote=cite.get('quote', ''))
-                    for cite in parsed_answer.get('citations', [])
-                ]
-                
-                return QuestionResponse(
-                    success=True,
-                    pdf=os.path.basename(pdf_path),
-                    question=request.question,
-                    ocr_method=request.ocr_method,
-                    answer=parsed_answer.get('answer', 'No answer'),
-                    confidence=parsed_answer.get('confidence', 0),
-                    language=parsed_answer.get('language', 'en'),
-                    citations=citations
-                )
-            except json.JSONDecodeError:
-                return QuestionResponse(
-                    success=True,
-                    pdf=os.path.basename(pdf_path),
-                    question=request.question,
-                    ocr_method=request.ocr_method,
-                    answer=answer,
-                    format="raw_text"
+        documents = corpus.resolve(request.pdfs or ["all"])
+    except KeyError as e:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": f"PDF not found: {e.args[0]}",
+                "available_pdfs": list(corpus.documents)
+            }
+        )
+    if not documents:
+        raise HTTPException(status_code=404, detail=f"No PDFs found in {PDF_BASE_PATH}")
+    label = "all" if not request.pdfs or "all" in request.pdfs else ",".join(documents)
+    return list(documents.values()), label
+
+def build_question_response(request: QuestionRequest, pdf_label: str, answer: str,
+                            pdf_path: Union[str, List[str], None] = None) -> QuestionResponse:
+    """
+    Turn a raw model answer into a QuestionResponse, parsing (and if needed
+    repairing) JSON when requested. With pdf_path, citations are checked
+    against the extracted page text, so call it via run_in_worker.
+    """
+    pdf_label = os.path.basename(pdf_label)
+    with stage("parse"):
+        return _build_question_response(request, pdf_label, answer, pdf_path)
+
+def _citation_documents(pdf_path: Union[str, List[str]]) -> Dict[str, str]:
+    paths = [pdf_path] if isinstance(pdf_path, str) else pdf_path
+    return {os.path.basename(path): path for path in paths}
+
+def _build_question_response(request: QuestionRequest, pdf_label: str, answer: str,
+                             pdf_path: Union[str, List[str], None] = None) -> QuestionResponse:
+    # Parse answer if JSON format
+    if request.format == "json":
+        parsed_answer, _ = parse_json_answer(answer)
+        if parsed_answer is not None:
+            raw_citations = parsed_answer.get('citations') or []
+            if not isinstance(raw_citations, list):
+                raw_citations = []
+            if VALIDATE_CITATIONS and pdf_path:
+                raw_citations = validate_citations(
+                    raw_citations, _citation_documents(pdf_path),
+                    lambda path: get_pdf_pages(path, request.ocr_method),
+                    lambda path, quote: citation_pages(path, quote, request.ocr_method)
                 )
+            citations = [
+                Citation(page=cite.get('page') or 0, quote=cite.get('quote') or '',
+                         document=cite.get('document'), verified=cite.get('verified'))
+                for cite in raw_citations if isinstance(cite, dict)
+            ]
+            
+            return QuestionResponse(
+                success=True,
+                pdf=pdf_label,
+                question=request.question,
+                ocr_method=request.ocr_method,
+                answer=parsed_answer.get('answer', 'No answer'),
+                confidence=parsed_answer.get('confidence', 0),
+                language=parsed_answer.get('language', 'en'),
+                citations=citations
+            )
         else:
             return QuestionResponse(
                 success=True,
-                pdf=os.path.basename(pdf_path),
+                pdf=pdf_label,
                 question=request.question,
                 ocr_method=request.ocr_method,
                 answer=answer,
-                format="free_text"
+                format="raw_text"
+            )
+    else:
+        return QuestionResponse(
+            success=True,
+            pdf=pdf_label,
+            question=request.question,
+            ocr_method=request.ocr_method,
+            answer=answer,
+            format="free_text"
+        )
+
+def llm_unavailable(error: LLMUnavailableError) -> HTTPException:
+    """503 with a Retry-After hint when every LLM backend is failing or throttled"""
+    headers = {"Retry-After": str(max(1, math.ceil(error.retry_after)))} if error.retry_after else None
+    return HTTPException(
+        status_code=503,
+        detail={"error": f"LLM unavailable: {str(error)}", "success": False},
+        headers=headers
+    )
+
+def admission_rejected(error: AdmissionRejected) -> HTTPException:
+    """429/503 with Retry-After for requests shed by admission control"""
+    return HTTPException(
+        status_code=error.status,
+        detail={"error": error.reason, "success": False},
+        headers={"Retry-After": error.retry_after_header}
+    )
+
+def check_client_rate(http_request: Request, cost: float, priority: str) -> None:
+    """Charge the caller's token bucket (API key, else client IP), raising 429 when empty"""
+    client = client_key(http_request.headers, http_request.client.host if http_request.client else None)
+    try:
+        admission.check_rate(client, cost, priority)
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+
+@app.post("/ask", response_model=QuestionResponse)
+async def ask_question(request: QuestionRequest, http_request: Request):
+    """
+    Ask questions about PDF documents with OCR support
+    """
+    try:
+        check_client_rate(http_request, 1, INTERACTIVE)
+        pdf_path, pdf_label = resolve_target(request)
+        
+        # Serve repeated questions from the answer cache
+        cache_scope = await run_in_worker(
+            answer_cache_scope, pdf_path, request.format, request.ocr_method,
+            request.top_k, request.retrieval_mode
+        )
+        if request.use_cache:
+            cached = answer_cache.get(cache_scope, request.question)
+            if cached is not None:
+                return cached.model_copy(update={"question": request.question, "pdf": pdf_label, "cache_hit": True})
+        
+        # Extraction runs on the shared worker pool and the LLM call is async;
+        # the timeout (which starts once admitted) cancels the in-flight LLM request
+        async with admission.slot(INTERACTIVE):
+            answer = await asyncio.wait_for(
+                pdf_qa_async(pdf_path, request.question,
+                             format_type=request.format,
+                             ocr_method=request.ocr_method,
+                             top_k=request.top_k,
+                             retrieval_mode=request.retrieval_mode),
+                timeout=ASK_TIMEOUT
             )
+        
+        response = await run_in_worker(build_question_response, request, pdf_label, answer, pdf_path)
+        if request.use_cache and not answer.startswith("Error"):
+            answer_cache.put(cache_scope, request.question, response)
+        return response
             
-    except concurrent.futures.TimeoutError:
+    except asyncio.TimeoutError:
         raise HTTPException(status_code=408, detail="Request timeout - processing took too long")
+    except AdmissionRejected as e:
+        raise admission_rejected(e)
+    except LLMUnavailableError as e:
+        raise llm_unavailable(e)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -169,11 +446,171 @@ async def ask_question(request: QuestionRequest):
             }
         )
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest, http_request: Request):
+    """
+    Ask a question and stream the answer as NDJSON events:
+    {"type": "delta", "text": ...} as answer text arrives, then one
+    {"type": "final", ...} carrying the full QuestionResponse with citations
+    and confidence, or {"type": "error", "error": ...}
+    """
+    check_client_rate(http_request, 1, INTERACTIVE)
+    pdf_path, pdf_label = resolve_target(request)
+    cache_scope = await run_in_worker(
+        answer_cache_scope, pdf_path, request.format, request.ocr_method,
+        request.top_k, request.retrieval_mode
+    )
+    cached = answer_cache.get(cache_scope, request.question) if request.use_cache else None
+
+    # Admit before the response starts so shedding is a real 429, and hold
+    # the slot until the stream ends
+    admitted = AsyncExitStack()
+    if cached is None:
+        try:
+            await admitted.enter_async_context(admission.slot(INTERACTIVE))
+        except AdmissionRejected as e:
+            raise admission_rejected(e)
+
+    async def events():
+        async with admitted:
+            async for line in answer_events():
+                yield line
+
+    async def answer_events():
+        if cached is not None:
+            response = cached.model_copy(update={"question": request.question, "pdf": pdf_label, "cache_hit": True})
+            yield ndjson_line({"type": "final", **response.model_dump()})
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ASK_TIMEOUT
+        stream = None
+        try:
+            prompt = await asyncio.wait_for(
+                run_in_worker(build_qa_prompt, pdf_path, request.question,
+                              ocr_method=request.ocr_method, top_k=request.top_k,
+                              retrieval_mode=request.retrieval_mode),
+                timeout=ASK_TIMEOUT
+            )
+            if prompt is None:
+                yield ndjson_line({"type": "error", "error": "Could not extract any text from PDF"})
+                return
+
+            extractor = AnswerStreamExtractor()
+            parts = []
+            stream = stream_azure_openai_async(prompt, request.format)
+            llm_start = time.perf_counter()
+            while True:
+                try:
+                    delta = await asyncio.wait_for(stream.__anext__(), timeout=deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                if not parts:
+                    STAGE_SECONDS.observe(time.perf_counter() - llm_start, stage="llm_first_token")
+                parts.append(delta)
+                text = extractor.feed(delta) if request.format == "json" else delta
+                if text:
+                    yield ndjson_line({"type": "delta", "text": text})
+
+            STAGE_SECONDS.observe(time.perf_counter() - llm_start, stage="llm")
+            answer = "".join(parts).strip()
+            response = await run_in_worker(build_question_response, request, pdf_label, answer, pdf_path)
+            if request.use_cache:
+                answer_cache.put(cache_scope, request.question, response)
+            yield ndjson_line({"type": "final", **response.model_dump()})
+        except asyncio.TimeoutError:
+            yield ndjson_line({"type": "error", "error": "Request timeout - processing took too long"})
+        except LLMUnavailableError as e:
+            yield ndjson_line({"type": "error", "error": f"LLM unavailable: {str(e)}",
+                               "retry_after": e.retry_after})
+        except Exception as e:
+            yield ndjson_line({"type": "error", "error": f"Processing error: {str(e)}"})
+        finally:
+            # On timeout or disconnect, close the LLM stream to free its connection
+            if stream is not None:
+                await stream.aclose()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/ask/batch", response_model=BatchQuestionResponse)
+async def ask_questions_batch(request: BatchQuestionRequest, http_request: Request):
+    """
+    Answer many questions against one PDF. The PDF is extracted and indexed
+    once, cached answers are reused, and the rest are dispatched with bounded
+    concurrency (optionally packing pack_size questions per prompt). With
+    stream=true, results are sent as NDJSON lines in completion order.
+    Batches run in the low-priority admission class, which may only use
+    part of the capacity, and cost one rate-limit token per question.
+    """
+    check_client_rate(http_request, max(1, len(request.questions)), BATCH)
+    pdf_path = resolve_pdf_path(request.pdf)
+    cache_scope = await run_in_worker(
+        answer_cache_scope, pdf_path, request.format, request.ocr_method,
+        request.top_k, request.retrieval_mode
+    )
+    sub_requests = [
+        QuestionRequest(question=question, pdf=request.pdf, ocr_method=request.ocr_method,
+                        format=request.format, top_k=request.top_k,
+                        retrieval_mode=request.retrieval_mode, use_cache=request.use_cache)
+        for question in request.questions
+    ]
+    cached = {}
+    if request.use_cache:
+        for i, question in enumerate(request.questions):
+            hit = answer_cache.get(cache_scope, question)
+            if hit is not None:
+                cached[i] = hit.model_copy(update={"question": question, "cache_hit": True})
+    pending = [i for i in range(len(request.questions)) if i not in cached]
+
+    # The batch holds one admission unit per concurrent LLM call, and runs
+    # with however many units it was granted
+    concurrency = min(max(1, request.concurrency), BATCH_MAX_CONCURRENCY)
+    admitted = AsyncExitStack()
+    if pending:
+        try:
+            concurrency = await admitted.enter_async_context(admission.slot(BATCH, concurrency))
+        except AdmissionRejected as e:
+            raise admission_rejected(e)
+
+    async def results():
+        async with admitted:
+            for i, response in cached.items():
+                yield i, response
+            async for j, answer in pdf_qa_batch_async(
+                pdf_path, [request.questions[i] for i in pending],
+                format_type=request.format, ocr_method=request.ocr_method,
+                top_k=request.top_k, retrieval_mode=request.retrieval_mode,
+                concurrency=concurrency,
+                pack_size=request.pack_size, timeout=ASK_TIMEOUT
+            ):
+                i = pending[j]
+                response = await run_in_worker(build_question_response, sub_requests[i], pdf_path, answer, pdf_path)
+                if request.use_cache and not answer.startswith("Error"):
+                    answer_cache.put(cache_scope, request.questions[i], response)
+                yield i, response
+
+    if request.stream:
+        async def events():
+            async for i, response in results():
+                yield ndjson_line({"index": i, **response.model_dump()})
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    ordered: List[Optional[QuestionResponse]] = [None] * len(request.questions)
+    async for i, response in results():
+        ordered[i] = response
+    return BatchQuestionResponse(
+        success=True,
+        pdf=os.path.basename(pdf_path),
+        total_count=len(ordered),
+        results=ordered
+    )
+
 @app.get("/pdfs", response_model=PDFListResponse)
 async def list_pdfs():
     """List all available PDF documents"""
+    documents = corpus.documents
     pdf_info = {}
-    for name, path in AVAILABLE_PDFS.items():
+    for name, path in documents.items():
         pdf_info[name] = PDFInfo(
             path=path,
             exists=os.path.exists(path),
@@ -182,19 +619,153 @@ async def list_pdfs():
     
     return PDFListResponse(
         available_pdfs=pdf_info,
-        total_count=len(AVAILABLE_PDFS)
+        total_count=len(documents)
+    )
+
+@app.post("/pdfs/rescan", response_model=PDFListResponse)
+async def rescan_pdfs():
+    """Rescan PDF_BASE_PATH and queue new or changed documents for ingestion"""
+    await ingestion_queue.rescan()
+    return await list_pdfs()
+
+def _open_upload(filename: str):
+    os.makedirs(PDF_BASE_PATH, exist_ok=True)
+    path = os.path.join(PDF_BASE_PATH, filename)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    return open(tmp_path, "wb"), tmp_path, path
+
+def _discard_upload(f, tmp_path: str) -> None:
+    f.close()
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+def _commit_upload(tmp_path: str, path: str, replace: bool) -> None:
+    """Move the upload into place; without replace, never over an existing file"""
+    if replace:
+        os.replace(tmp_path, path)
+        return
+    # link() fails if path exists, so a concurrent upload cannot be overwritten
+    os.link(tmp_path, path)
+    os.remove(tmp_path)
+
+@contextmanager
+def corpus_conflicts():
+    """Turn corpus name errors into 400 (reserved name) and 409 (name or file taken)"""
+    try:
+        yield
+    except FileExistsError as e:
+        raise HTTPException(status_code=409, detail=f"{e}; pass replace=true to overwrite it")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def save_upload(request: Request, filename: str, replace: bool = False) -> str:
+    """
+    Stream the request body to a temp file under PDF_BASE_PATH, enforcing
+    MAX_UPLOAD_MB and the PDF signature as bytes arrive, then move it into
+    place atomically. An existing file is only overwritten with replace;
+    otherwise FileExistsError is raised. Returns the final path.
+    """
+    max_bytes = int(MAX_UPLOAD_MB * 1024 * 1024)
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"PDF exceeds {MAX_UPLOAD_MB:g} MB")
+
+    f, tmp_path, path = await run_in_worker(_open_upload, filename)
+    try:
+        size = 0
+        head = b""
+        async for piece in request.stream():
+            size += len(piece)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"PDF exceeds {MAX_UPLOAD_MB:g} MB")
+            if len(head) < 5:
+                head += piece[:5 - len(head)]
+                if len(head) == 5 and head != b"%PDF-":
+                    raise HTTPException(status_code=400, detail="Request body is not a PDF")
+            await run_in_worker(f.write, piece)
+        if head != b"%PDF-":
+            raise HTTPException(status_code=400, detail="Request body is not a PDF")
+        await run_in_worker(f.close)
+        await run_in_worker(_commit_upload, tmp_path, path, replace)
+    except BaseException:
+        _discard_upload(f, tmp_path)
+        raise
+    return path
+
+@app.post("/pdfs/upload", response_model=IngestionJobInfo, status_code=202)
+async def upload_pdf(request: Request, filename: str, name: Optional[str] = None, replace: bool = False):
+    """
+    Upload a PDF as the raw request body (Content-Type: application/pdf).
+    The file is streamed to disk under PDF_BASE_PATH and ingested in the
+    background; poll /ingest/jobs/{id} for progress. An existing file or
+    document name is a 409 unless replace=true.
+    """
+    safe_name = re.sub(r"[^A-Za-z0-9._-]+", "_", os.path.basename(filename)).lstrip(".")
+    if not safe_name.lower().endswith(".pdf"):
+        safe_name += ".pdf"
+    path = os.path.join(PDF_BASE_PATH, safe_name)
+    doc_name = name or document_name(safe_name)
+
+    # Fail before reading the body; both are checked again when committing
+    with corpus_conflicts():
+        corpus.check_name(doc_name, path, replace)
+        if not replace and os.path.exists(path):
+            raise FileExistsError(f"File '{safe_name}' already exists")
+        path = await save_upload(request, safe_name, replace)
+    try:
+        with corpus_conflicts():
+            doc_name = corpus.register(path, doc_name, replace)
+    except HTTPException:
+        if not replace:
+            # The file was new; don't leave an unregistered copy behind
+            await run_in_worker(os.remove, path)
+        raise
+    job = ingestion_queue.submit(doc_name, path, "upload")
+    return IngestionJobInfo(**job.to_dict())
+
+@app.post("/pdfs/register", response_model=IngestionJobInfo, status_code=202)
+async def register_pdf(request: RegisterPDFRequest):
+    """Register a PDF already on the server's disk and ingest it in the background"""
+    if not os.path.isfile(request.path) or not request.path.lower().endswith(".pdf"):
+        raise HTTPException(status_code=404, detail=f"PDF file does not exist: {request.path}")
+    with corpus_conflicts():
+        doc_name = corpus.register(request.path, request.name, request.replace)
+    job = ingestion_queue.submit(doc_name, request.path, "register")
+    return IngestionJobInfo(**job.to_dict())
+
+@app.get("/ingest/jobs", response_model=IngestionJobList)
+async def list_ingestion_jobs(status: Optional[str] = None):
+    """Recent ingestion jobs, newest first, optionally filtered by status"""
+    jobs = [job.to_dict() for job in reversed(ingestion_queue.jobs.values())
+            if status is None or job.status == status]
+    return IngestionJobList(
+        queue_depth=ingestion_queue.queue_depth(),
+        jobs=[IngestionJobInfo(**job) for job in jobs]
     )
 
+@app.get("/ingest/jobs/{job_id}", response_model=IngestionJobInfo)
+async def get_ingestion_job(job_id: str):
+    """Status of one ingestion job"""
+    job = ingestion_queue.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job '{job_id}' not found")
+    return IngestionJobInfo(**job.to_dict())
+
 @app.get("/inspect/{pdf_name}", response_model=PDFInspectionResponse)
-async def inspect_pdf(pdf_name: str):
-    """Inspect PDF content and structure"""
-    if pdf_name not in AVAILABLE_PDFS:
+async def inspect_pdf(pdf_name: str, preview: int = 3, full: bool = False):
+    """
+    Inspect PDF content and structure. Only the preview pages are extracted;
+    pass full=true to extract everything and report total_characters.
+    """
+    pdf_path = corpus.get(pdf_name)
+    if pdf_path is None:
         raise HTTPException(
             status_code=404,
-            detail=f"PDF '{pdf_name}' not found. Available: {list(AVAILABLE_PDFS.keys())}"
+            detail=f"PDF '{pdf_name}' not found. Available: {list(corpus.documents)}"
         )
-    
-    pdf_path = AVAILABLE_PDFS[pdf_name]
+
     if not os.path.exists(pdf_path):
         raise HTTPException(
             status_code=404,
@@ -202,35 +773,28 @@ async def inspect_pdf(pdf_name: str):
         )
     
     try:
-        # Run PDF extraction in thread
-        def extract_pages():
-            return extract_pdf_text_per_page(pdf_path, use_ocr=True)
-        
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(extract_pages)
-            pages = future.result(timeout=30)
-        
-        preview_pages = []
-        for i, page_text in enumerate(pages[:3], 1):  # Show first 3 pages
-            preview_pages.append({
-                "page_number": i,
-                "character_count": len(page_text.strip()),
-                "preview": page_text.strip()[:300] + "..." if len(page_text.strip()) > 300 else page_text.strip()
-            })
+        # Run PDF inspection on the shared worker pool
+        summary = await asyncio.wait_for(
+            run_in_worker(inspect_pdf_pages, pdf_path, max(0, preview), full),
+            timeout=INSPECT_TIMEOUT
+        )
         
         return PDFInspectionResponse(
             pdf_name=pdf_name,
             filename=os.path.basename(pdf_path),
-            total_pages=len(pages),
-            preview_pages=preview_pages,
-            total_characters=sum(len(page.strip()) for page in pages)
+            **summary
         )
         
-    except concurrent.futures.TimeoutError:
+    except asyncio.TimeoutError:
         raise HTTPException(status_code=408, detail="PDF inspection timeout")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error inspecting PDF: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus-style metrics: stage timings, token counts, cache hit ratios"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -241,9 +805,17 @@ async def root():
         "redoc": "/redoc",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
             "ask": "/ask (POST)",
+            "ask_stream": "/ask/stream (POST, NDJSON)",
+            "ask_batch": "/ask/batch (POST)",
             "pdfs": "/pdfs",
-            "inspect": "/inspect/{pdf_name}"
+            "inspect": "/inspect/{pdf_name}",
+            "rescan": "/pdfs/rescan (POST)",
+            "upload": "/pdfs/upload?filename=&name=&replace= (POST, application/pdf body)",
+            "register": "/pdfs/register (POST)",
+            "ingest_jobs": "/ingest/jobs",
+            "metrics": "/metrics"
         }
     }
 
@@ -0,0 +1,185 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# ---------- Configuration ----------
+# Add a Server-Timing header with per-stage durations to every response
+TIMING_HEADERS = os.getenv("METRICS_TIMING_HEADERS", "0").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+# ---------- Metric types ----------
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # label key -> (bucket counts, sum, count)
+        self._values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {n}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {n}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauge whose samples are read from a callback at scrape time"""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], Dict[LabelKey, float]]):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = self.read()
+        except Exception as e:
+            print(f"Metric {self.name} unavailable: {e}")
+            return lines
+        for key, value in sorted(samples.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+REGISTRY: List[object] = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text format"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Pipeline metrics ----------
+REQUEST_SECONDS = register(Histogram("pdfqa_request_seconds", "HTTP request latency by route and status"))
+STAGE_SECONDS = register(Histogram("pdfqa_stage_seconds", "Time spent in each /ask pipeline stage"))
+LLM_TOKENS = register(Counter("pdfqa_llm_tokens_total", "LLM tokens by kind (prompt/completion)"))
+LLM_CALLS = register(Counter("pdfqa_llm_calls_total", "LLM calls by outcome"))
+
+# Stage durations for the current request; worker threads see the same dict
+# because run_in_worker() copies the context
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into pdfqa_stage_seconds and the request timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def start_request_timings() -> Tuple[Dict[str, float], contextvars.Token]:
+    timings: Dict[str, float] = {}
+    return timings, _request_timings.set(timings)
+
+
+def end_request_timings(token: contextvars.Token) -> None:
+    _request_timings.reset(token)
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Format timings as a Server-Timing header value (durations in ms)"""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def record_llm_usage(usage) -> None:
+    """Count prompt/completion tokens from an OpenAI-style usage object"""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, kind="completion")
+
+
+def register_cache(name: str, cache) -> None:
+    """
+    Export hit/miss counts and the hit ratio of a cache object that keeps
+    `hits` and `misses` attributes (near_hits counts as hits when present)
+    """
+    def read() -> Dict[LabelKey, float]:
+        hits = cache.hits + getattr(cache, "near_hits", 0)
+        misses = cache.misses
+        samples = {
+            _label_key({"cache": name, "result": "hit"}): hits,
+            _label_key({"cache": name, "result": "miss"}): misses,
+        }
+        if hits + misses:
+            samples[_label_key({"cache": name, "result": "ratio"})] = hits / (hits + misses)
+        return samples
+
+    register(GaugeCallback(f"pdfqa_cache_{name}", f"{name} cache lookups and hit ratio", read))
@@ -0,0 +1,207 @@
+import os
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional
+
+from pdf_cache import PartialPages
+
+# ---------- Configuration ----------
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+# "auto" uses pytesseract when installed, else PyMuPDF's built-in Tesseract binding
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+# Pages whose text layer has fewer characters than this are OCR'd
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", "20"))
+OCR_CACHE_DIR = os.getenv(
+    "OCR_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ocr"),
+)
+OCR_CACHE_VERSION = 1
+
+
+# ---------- Engines ----------
+def _ocr_pytesseract(page, dpi: int, language: str) -> str:
+    import io
+
+    import pytesseract
+    from PIL import Image
+
+    pix = page.get_pixmap(dpi=dpi, colorspace="gray", alpha=False)
+    image = Image.open(io.BytesIO(pix.tobytes("png")))
+    return pytesseract.image_to_string(image, lang=language)
+
+
+def _ocr_pymupdf(page, dpi: int, language: str) -> str:
+    textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True)
+    return page.get_text("text", textpage=textpage)
+
+
+def resolve_engine(name: str = OCR_ENGINE) -> Optional[str]:
+    """Return the usable OCR engine name for this process, or None"""
+    if name in ("auto", "pytesseract"):
+        try:
+            import pytesseract  # noqa: F401
+            from PIL import Image  # noqa: F401
+
+            return "pytesseract"
+        except ImportError:
+            if name == "pytesseract":
+                return None
+    if name in ("auto", "pymupdf"):
+        try:
+            import fitz  # PyMuPDF
+
+            # get_tessdata() raises when no Tesseract language data is installed
+            if hasattr(fitz, "get_tessdata"):
+                fitz.get_tessdata()
+            return "pymupdf"
+        except Exception:
+            return None
+    return None
+
+
+_ENGINES: Dict[str, Callable] = {"pytesseract": _ocr_pytesseract, "pymupdf": _ocr_pymupdf}
+
+
+def ocr_page(pdf_path: str, page_index: int, engine: str, dpi: int = OCR_DPI,
+             language: str = OCR_LANGUAGE) -> str:
+    """
+    Rasterize and OCR one page. Runs in a worker process, so it opens the
+    document itself.
+    """
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(pdf_path)
+    try:
+        return _ENGINES[engine](doc[page_index], dpi, language).strip()
+    finally:
+        doc.close()
+
+
+# ---------- Page hashing and cache ----------
+def page_hash(doc, page, engine: str, dpi: int = OCR_DPI, language: str = OCR_LANGUAGE) -> str:
+    """
+    Hash what the page draws (content streams plus embedded image data) and
+    the OCR settings. Identical scanned pages share a hash across documents
+    and revisions.
+    """
+    digest = hashlib.sha256(f"{OCR_CACHE_VERSION}:{engine}:{dpi}:{language}".encode())
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    digest.update(repr(tuple(page.rect)).encode())
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Per-page OCR results on disk as <hash>.txt under cache_dir, so each
+    distinct page is OCR'd at most once
+    """
+
+    def __init__(self, cache_dir: str = OCR_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"OCR cache write failed for {key}: {e}")
+
+
+ocr_cache = OCRCache()
+
+
+# ---------- Selective OCR ----------
+def needs_ocr(page, text: str, min_chars: int = OCR_MIN_TEXT_CHARS) -> bool:
+    """
+    A page needs OCR when it has (almost) no text layer but draws something:
+    scanned images, or vector drawings with outlined lettering
+    """
+    if len(text.strip()) >= min_chars:
+        return False
+    return bool(page.get_images()) or len(page.read_contents()) > 0
+
+
+def ocr_missing_text(pdf_path: str, pages: List[str], executor=None) -> List[str]:
+    """
+    Fill in text for pages that have no usable text layer.
+
+    `pages` is the text-layer extraction. Pages that need OCR are looked up
+    in the OCR cache by page hash; the rest are OCR'd one page per task on
+    `executor` (a process pool), or serially when it is None. Pages whose
+    OCR fails, or every page needing OCR when no engine is installed, keep
+    their extracted text and the result is returned as PartialPages.
+    """
+    import fitz  # PyMuPDF
+
+    engine = resolve_engine()
+    pending: Dict[int, str] = {}
+    missing: List[int] = []
+    result = list(pages)
+    doc = fitz.open(pdf_path)
+    try:
+        for i, page in enumerate(doc):
+            if i >= len(result) or not needs_ocr(page, result[i]):
+                continue
+            if engine is None:
+                missing.append(i)
+                continue
+            key = page_hash(doc, page, engine)
+            cached = ocr_cache.get(key)
+            if cached is not None:
+                result[i] = cached or result[i]
+            else:
+                pending[i] = key
+    finally:
+        doc.close()
+
+    if missing:
+        print(f"No OCR engine available (install pytesseract or Tesseract); "
+              f"{len(missing)} page(s) of {pdf_path} use the text layer only")
+        return PartialPages(result, missing)
+
+    if executor is not None and len(pending) > 1:
+        futures = {i: executor.submit(ocr_page, pdf_path, i, engine) for i in pending}
+        outcomes = {}
+        for i, future in futures.items():
+            try:
+                outcomes[i] = future.result()
+            except Exception as e:
+                print(f"OCR of page {i + 1} of {pdf_path} failed: {e}")
+    else:
+        outcomes = {}
+        for i in pending:
+            try:
+                outcomes[i] = ocr_page(pdf_path, i, engine)
+            except Exception as e:
+                print(f"OCR of page {i + 1} of {pdf_path} failed: {e}")
+
+    for i, text in outcomes.items():
+        ocr_cache.put(pending[i], text)
+        result[i] = text or result[i]
+    missing = [i for i in pending if i not in outcomes]
+    return PartialPages(result, missing) if missing else result
@@ -0,0 +1,191 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from doc_store import MappedPages, write_pages
+from singleflight import SingleFlight
+
+# ---------- Configuration ----------
+CACHE_VERSION = 2
+PDF_CACHE_DIR = os.getenv(
+    "PDF_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "extraction"),
+)
+PDF_CACHE_MAX_ENTRIES = int(os.getenv("PDF_CACHE_MAX_ENTRIES", "64"))
+
+# ---------- Fingerprinting ----------
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def count_pdf_pages(path: str) -> int:
+    """Return the page count from the PDF structure (no text extraction)"""
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        return 0
+    try:
+        doc = fitz.open(path)
+        try:
+            return doc.page_count
+        finally:
+            doc.close()
+    except Exception:
+        return 0
+
+
+class PartialPages(list):
+    """
+    Pages from an extraction that did not fully succeed, e.g. OCR was
+    unavailable or failed for some pages. Callers can use them, but the
+    extraction cache never persists them, so a later run can fill the gaps.
+    """
+
+    def __init__(self, pages: Sequence[str], missing: Sequence[int] = ()):
+        super().__init__(pages)
+        self.missing = list(missing)  # 0-based indexes of the incomplete pages
+
+
+# ---------- Extraction cache ----------
+class ExtractionCache:
+    """
+    Two-level cache for extracted page text.
+
+    Entries are keyed by (content hash, page count, extraction method) and
+    persisted under cache_dir in the doc_store page format. The in-memory
+    LRU holds MappedPages views of those files, so page text lives in the
+    OS page cache and is shared by every worker process.
+    File fingerprints are memoized on (path, mtime, size) so a warm lookup
+    does not re-hash or re-open the PDF.
+    """
+
+    def __init__(self, cache_dir: str = PDF_CACHE_DIR, max_entries: int = PDF_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Sequence[str]]" = OrderedDict()
+        self._fingerprints: Dict[Tuple[str, int, int], Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+        self._flights = SingleFlight("extraction")
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, pdf_path: str) -> Tuple[str, int]:
+        """Return (sha256, page_count) for a PDF, memoized on its stat signature"""
+        path = os.path.abspath(pdf_path)
+        st = os.stat(path)
+        stat_key = (path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._fingerprints.get(stat_key)
+        if cached is not None:
+            return cached
+        result = (file_sha256(path), count_pdf_pages(path))
+        with self._lock:
+            # Drop stale fingerprints for the same path
+            for key in [k for k in self._fingerprints if k[0] == path]:
+                del self._fingerprints[key]
+            self._fingerprints[stat_key] = result
+        return result
+
+    def key_for(self, pdf_path: str, method: str) -> str:
+        sha, page_count = self.fingerprint(pdf_path)
+        return f"{sha}-{page_count}-{method}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.v{CACHE_VERSION}.pages")
+
+    def _remember(self, key: str, pages: Sequence[str]) -> None:
+        with self._lock:
+            self._memory[key] = pages
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, pdf_path: str, method: str) -> Optional[Sequence[str]]:
+        """Return cached pages or None"""
+        key = self.key_for(pdf_path, method)
+        with self._lock:
+            pages = self._memory.get(key)
+            if pages is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return pages
+
+        pages = self._open(key)
+        with self._lock:
+            if pages is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, pages)
+        return pages
+
+    def put(self, pdf_path: str, method: str, pages: List[str]) -> None:
+        """
+        Store pages on disk and keep the memory-mapped copy, so the
+        extracted list is not held per process
+        """
+        key = self.key_for(pdf_path, method)
+        self._store(key, pages)
+        self._remember(key, self._open(key) or pages)
+
+    def get_or_extract(self, pdf_path: str, method: str,
+                       extract: Callable[[str], List[str]]) -> Sequence[str]:
+        """
+        Return cached pages, running extract(pdf_path) on a miss. Concurrent
+        misses for the same key wait on one extraction. PartialPages results
+        are returned but not cached.
+        """
+        pages = self.get(pdf_path, method)
+        if pages is not None:
+            return pages
+
+        def extract_once() -> Sequence[str]:
+            # A caller that waited on an earlier flight may find it cached now
+            with self._lock:
+                cached = self._memory.get(key)
+            if cached is not None:
+                return cached
+            pages = extract(pdf_path)
+            # Empty or partial results mean extraction failed; don't pin them
+            if not pages or isinstance(pages, PartialPages):
+                return pages
+            self.put(pdf_path, method, pages)
+            with self._lock:
+                # Hand back the memory-mapped copy so the extracted list can be freed
+                return self._memory.get(key, pages)
+
+        key = self.key_for(pdf_path, method)
+        return self._flights.do(key, extract_once)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._fingerprints.clear()
+
+    def _open(self, key: str) -> Optional[Sequence[str]]:
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return MappedPages(path)
+        except Exception as e:
+            print(f"Ignoring unreadable extraction cache file {path}: {e}")
+            return None
+
+    def _store(self, key: str, pages: List[str]) -> None:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write_pages(self._disk_path(key), pages)
+        except Exception as e:
+            print(f"Could not persist extraction cache entry {key}: {e}")
+
+
+# Shared application-wide cache
+extraction_cache = ExtractionCache()
@@ -1,62 +1,68 @@
 import os
-from typing import List, Dict, Optional
+import asyncio
+import concurrent.futures
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Sequence, Tuple, Union
 import json
+import hashlib
+import threading
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables before the modules below read their settings
 load_dotenv()
 
-# ---------- Azure OpenAI Setup ----------
-def setup_azure_openai():
-    """Setup Azure OpenAI client"""
-    try:
-        from openai import AzureOpenAI
-        
-        # Azure OpenAI configuration from environment
-        api_key = os.getenv("AZURE_OPENAI_API_KEY", "8OgwTbueNSFrNWeEUZ2tOgnlVwYC7PXLiULoOZKz6JQgWkNcWjucJQQJ99BHACL93NaXJ3w3AAAAACOGzn2y")
-        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "https://azureaitestenv.cognitiveservices.azure.com/")
-        deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4")
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
-        
-        client = AzureOpenAI(
-            api_key=api_key,
-            api_version=api_version,
-            azure_endpoint=endpoint
-        )
-        
-        return client, deployment
-    except Exception as e:
-        print(f"Azure OpenAI setup failed: {e}")
-        print("Using mock client for demonstration...")
-        
-        # Mock client for demonstration
-        class MockClient:
-            class Chat:
-                class Completions:
-                    def create(self, **kwargs):
-                        class MockResponse:
-                            def __init__(self):
-                                self.choices = [MockChoice()]
-                        class MockChoice:
-                            def __init__(self):
-                                self.message = MockMessage()
-                        class MockMessage:
-                            def __init__(self):
-                                self.content = '{"answer": "Mock response - please configure Azure OpenAI credentials", "confidence": 0.5, "language": "en", "citations": []}'
-                        return MockResponse()
-                
-                def __init__(self):
-                    self.completions = self.Completions()
-            
-            def __init__(self):
-                self.chat = self.Chat()
-        
-        return MockClient(), "mock-deployment"
+from pdf_cache import PartialPages, extraction_cache
+from workers import run_in_worker
+from metrics import stage
+from llm_backends import LLMRouter, LLMUnavailableError, setup_llm_router
+from singleflight import AsyncSingleFlight
+from answer_parsing import parse_json_answer
+from token_budget import LLM_CONTEXT_TOKENS, content_budget, pack_chunks, rank_pages
+from retrieval import (DEFAULT_RETRIEVAL_MODE, DEFAULT_TOP_K, BM25Index, Chunk, bm25_indexes,
+                       build_retrieved_block, chunk_pages, corpus_indexes, reciprocal_rank_fusion)
 
-# Setup Azure OpenAI
-client, deployment = setup_azure_openai()
+# ---------- LLM backends ----------
+# Azure, an OpenAI-compatible local server or the mock, in LLM_BACKENDS failover
+# order. Built on first use so importing this module stays cheap (the openai
+# SDK alone takes ~0.4s to import).
+_llm: Optional[LLMRouter] = None
+_llm_lock = threading.Lock()
+
+def get_llm() -> LLMRouter:
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = setup_llm_router()
+    return _llm
+
+def set_llm(router: LLMRouter) -> None:
+    """Replace the LLM router (e.g. with a mock in benchmarks)"""
+    global _llm
+    _llm = router
+
+def preload_pdf_engine() -> None:
+    """Import PyMuPDF ahead of the first extraction (its first import is the slow one)"""
+    try:
+        import fitz  # noqa: F401  PyMuPDF
+    except ImportError as e:
+        print(f"PyMuPDF import error: {e}")
 
 # ---------- Simplified PDF text extraction (no OCR) ----------
+def extract_page_text(page) -> str:
+    """
+    Extract text from one PyMuPDF page, falling back to the blocks method
+    """
+    # Extract text directly
+    text = page.get_text("text")
+    
+    # If no text found, try blocks method
+    if not text.strip():
+        text_blocks = page.get_text("blocks")
+        if isinstance(text_blocks, list):
+            text = "\n".join([b[4] for b in text_blocks if len(b) >= 5 and isinstance(b[4], str)])
+    
+    return text.strip()
+
 def extract_pdf_text_per_page(pdf_path: str, use_ocr: bool = True) -> List[str]:
     """
     Extract text per page using PyMuPDF (fitz) - basic text extraction only.
@@ -68,21 +74,10 @@ def extract_pdf_text_per_page(pdf_path: str, use_ocr: bool = True) -> List[str]:
         return []
 
     try:
-        doc = fitz.open(pdf_path)
-        pages = []
-        
-        for page_num, page in enumerate(doc, 1):
-            # Extract text directly
-            text = page.get_text("text")
-            
-            # If no text found, try blocks method
-            if not text.strip():
-                text_blocks = page.get_text("blocks")
-                if isinstance(text_blocks, list):
-                    text = "\n".join([b[4] for b in text_blocks if len(b) >= 5 and isinstance(b[4], str)])
-            
-            pages.append(text.strip())
-        
+        with stage("pdf_open"):
+            doc = fitz.open(pdf_path)
+        with stage("extract"):
+            pages = [extract_page_text(page) for page in doc]
         doc.close()
         return pages
         
@@ -90,13 +85,288 @@ def extract_pdf_text_per_page(pdf_path: str, use_ocr: bool = True) -> List[str]:
         print(f"Error extracting PDF text: {e}")
         return []
 
-# ---------- Fallback method (same as above) ----------
+# ---------- Parallel extraction for large PDFs ----------
+PARALLEL_MIN_PAGES = int(os.getenv("PARALLEL_EXTRACTION_MIN_PAGES", "32"))
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """
+    Extract pages [start, stop) in a worker process; each worker opens the
+    document itself since fitz documents cannot be shared across processes
+    """
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(pdf_path)
+    try:
+        return [extract_page_text(doc[i]) for i in range(start, stop)]
+    finally:
+        doc.close()
+
+def extract_pdf_text_parallel(pdf_path: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Extract text per page by splitting the page range across the shared
+    process pool and merging the results in page order. Small documents are
+    extracted serially since process dispatch would cost more than it saves.
+    """
+    from pdf_cache import count_pdf_pages
+    from workers import PROCESS_POOL_SIZE, get_process_pool
+
+    page_count = count_pdf_pages(pdf_path)
+    workers = max_workers or PROCESS_POOL_SIZE
+    if page_count < PARALLEL_MIN_PAGES or workers < 2:
+        return extract_pdf_text_per_page(pdf_path, use_ocr=True)
+
+    # A few ranges per worker keeps the pool busy when pages vary in cost
+    n_ranges = min(page_count, workers * 4)
+    bounds = [page_count * i // n_ranges for i in range(n_ranges + 1)]
+    try:
+        pool = get_process_pool()
+        futures = [
+            pool.submit(extract_page_range, pdf_path, bounds[i], bounds[i + 1])
+            for i in range(n_ranges)
+        ]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    except Exception as e:
+        print(f"Parallel extraction failed ({e}), falling back to serial extraction")
+        return extract_pdf_text_per_page(pdf_path, use_ocr=True)
+
+# ---------- OCR for pages without a text layer ----------
+def extract_pdf_text_with_ocr(pdf_path: str) -> List[str]:
+    """
+    Extract the text layer, then OCR only the pages that have images but no
+    usable text (scans, drawings). Pages are rasterized at OCR_DPI and OCR'd
+    in parallel on the shared process pool, and results are cached per page
+    hash so each page is OCR'd at most once. If OCR is unavailable or fails
+    the text layer is returned as PartialPages, which is not cached.
+    """
+    from ocr import ocr_missing_text
+    from workers import PROCESS_POOL_SIZE, get_process_pool
+
+    pages = extract_pdf_text_per_page(pdf_path, use_ocr=False)
+    if not pages:
+        return pages
+    with stage("ocr"):
+        try:
+            executor = get_process_pool() if PROCESS_POOL_SIZE > 1 else None
+            return ocr_missing_text(pdf_path, pages, executor)
+        except Exception as e:
+            print(f"OCR failed ({e}), using text layer only")
+            return PartialPages(pages, range(len(pages)))
+
 def extract_pdf_text_with_pdf2image(pdf_path: str) -> List[str]:
     """
-    Fallback method - same as basic extraction since OCR is not available
+    Kept for the "pdf2image" API option; pages are rasterized with PyMuPDF,
+    so poppler is not needed
+    """
+    return extract_pdf_text_with_ocr(pdf_path)
+
+# ---------- Cached extraction ----------
+def extract_pages_for_method(pdf_path: str, ocr_method: str = "pymupdf") -> List[str]:
+    """
+    Run the extractor that matches ocr_method, bypassing the cache
+    """
+    if ocr_method in ("ocr", "pdf2image"):
+        return extract_pdf_text_with_ocr(pdf_path)
+    elif ocr_method == "parallel":
+        return extract_pdf_text_parallel(pdf_path)
+    elif ocr_method == "no_ocr":
+        return extract_pdf_text_per_page(pdf_path, use_ocr=False)
+    else:  # pymupdf (default)
+        return extract_pdf_text_per_page(pdf_path, use_ocr=True)
+
+# Methods that produce the same text share cache entries
+CACHE_METHOD_ALIASES = {"parallel": "pymupdf", "pdf2image": "ocr"}
+
+def extraction_key(pdf_path: str, ocr_method: str = "pymupdf") -> str:
+    """Cache key for a PDF's extracted pages (and the indexes built on them)"""
+    return extraction_cache.key_for(pdf_path, CACHE_METHOD_ALIASES.get(ocr_method, ocr_method))
+
+def get_pdf_pages(pdf_path: str, ocr_method: str = "pymupdf") -> Sequence[str]:
+    """
+    Return extracted pages, served from the extraction cache when warm
+    """
+    return extraction_cache.get_or_extract(
+        pdf_path, CACHE_METHOD_ALIASES.get(ocr_method, ocr_method),
+        lambda path: extract_pages_for_method(path, ocr_method)
+    )
+
+# ---------- Lazy page access ----------
+class LazyPDFPages:
+    """
+    On-demand page access over a PyMuPDF document.
+
+    Page count and per-page content-stream sizes come from the document
+    structure; text is extracted only for the pages actually read, so
+    callers that stop early never pay for the rest of the document.
+    """
+
+    def __init__(self, pdf_path: str):
+        import fitz  # PyMuPDF
+
+        self.doc = fitz.open(pdf_path)
+        self._texts: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self.doc.page_count
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self.text(index)
+
+    def text(self, index: int) -> str:
+        """Extracted text of page `index` (0-based)"""
+        if index not in self._texts:
+            with stage("extract"):
+                self._texts[index] = extract_page_text(self.doc[index])
+        return self._texts[index]
+
+    def content_size(self, index: int) -> int:
+        """Raw (compressed) size of the page's content streams in bytes"""
+        total = 0
+        for xref in self.doc[index].get_contents():
+            kind, value = self.doc.xref_get_key(xref, "Length")
+            if kind == "int":
+                total += int(value)
+            else:
+                # Indirect or missing /Length: read the raw stream instead
+                total += len(self.doc.xref_stream_raw(xref) or b"")
+        return total
+
+    def close(self) -> None:
+        self.doc.close()
+
+    def __enter__(self) -> "LazyPDFPages":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def inspect_pdf_pages(pdf_path: str, preview_pages: int = 3, full: bool = False) -> Dict:
+    """
+    Summarize a PDF for /inspect in O(preview pages): page count and content
+    sizes from the document structure, text only for the preview pages.
+    total_characters is exact when the extraction cache is warm or full=True,
+    otherwise None.
+    """
+    cached = get_pdf_pages(pdf_path, "pymupdf") if full else extraction_cache.get(pdf_path, "pymupdf")
+    with LazyPDFPages(pdf_path) as lazy:
+        count = len(lazy)
+        previews = []
+        for index in range(min(preview_pages, count)):
+            text = cached[index] if cached is not None else lazy.text(index)
+            previews.append({
+                "page_number": index + 1,
+                "character_count": len(text),
+                "content_bytes": lazy.content_size(index),
+                "preview": text[:300] + "..." if len(text) > 300 else text
+            })
+        content_bytes = sum(lazy.content_size(index) for index in range(count))
+    return {
+        "total_pages": count,
+        "total_characters": sum(len(page) for page in cached) if cached is not None else None,
+        "content_bytes": content_bytes,
+        "preview_pages": previews,
+    }
+
+# ---------- Retrieval ----------
+def get_pdf_index(pdf_path: str, ocr_method: str = "pymupdf") -> Optional[BM25Index]:
+    """
+    Return the BM25 index over a PDF's page chunks, built once per extraction
+    """
+    pages = get_pdf_pages(pdf_path, ocr_method)
+    if not pages:
+        return None
+    key = extraction_key(pdf_path, ocr_method)
+    return bm25_indexes.get_or_build(key, lambda: BM25Index(chunk_pages({pdf_path: pages})))
+
+def get_dense_index(pdf_path: str, ocr_method: str = "pymupdf"):
+    """
+    Return the dense embedding index for a PDF (row-aligned with the BM25
+    chunks), or None if numpy is not installed
+    """
+    try:
+        from dense_index import dense_indexes
+    except ImportError as e:
+        print(f"Dense retrieval unavailable: {e}")
+        return None
+
+    index = get_pdf_index(pdf_path, ocr_method)
+    if index is None:
+        return None
+    key = extraction_key(pdf_path, ocr_method)
+    return dense_indexes.get_or_build(key, os.path.abspath(pdf_path), index.chunks)
+
+def retrieve_chunks(pdf_path: str, question: str, ocr_method: str = "pymupdf",
+                    top_k: int = DEFAULT_TOP_K, mode: str = DEFAULT_RETRIEVAL_MODE) -> List[Chunk]:
+    """
+    Return the top_k chunks for a question using "bm25", "dense" or "hybrid"
+    """
+    index = get_pdf_index(pdf_path, ocr_method)
+    if index is None:
+        return []
+    if mode in ("dense", "hybrid"):
+        dense = get_dense_index(pdf_path, ocr_method)
+        if dense is not None:
+            dense_hits = dense.search(question, top_k=top_k)
+            if mode == "dense":
+                return [chunk for chunk, _ in dense_hits]
+            bm25_hits = index.search(question, top_k=top_k)
+            return [chunk for chunk, _ in reciprocal_rank_fusion([bm25_hits, dense_hits], top_k=top_k)]
+    return [chunk for chunk, _ in index.search(question, top_k=top_k)]
+
+CITATION_SEARCH_TOP_K = 3
+
+def citation_pages(pdf_path: str, quote: str, ocr_method: str = "pymupdf") -> List[int]:
+    """Pages of the chunks that best match a quote, from the cached BM25 index"""
+    index = get_pdf_index(pdf_path, ocr_method)
+    if index is None:
+        return []
+    return [chunk.page for chunk, score in index.search(quote, top_k=CITATION_SEARCH_TOP_K) if score > 0]
+
+def get_corpus_index(pdf_paths: List[str], ocr_method: str = "pymupdf") -> Optional[BM25Index]:
+    """
+    Return one BM25 index over the chunks of several PDFs, cached per set of
+    document versions; chunk sources keep per-document citations apart.
+    A warm lookup only fingerprints the files: pages are read and chunked
+    only when the merged index has to be built.
+    """
+    keys = sorted(f"{os.path.abspath(path)}:{extraction_key(path, ocr_method)}" for path in pdf_paths)
+    key = "corpus:" + hashlib.sha1("|".join(keys).encode("utf-8")).hexdigest()
+
+    def build() -> Optional[BM25Index]:
+        docs_pages = {}
+        for path in pdf_paths:
+            pages = get_pdf_pages(path, ocr_method)
+            if pages:
+                docs_pages[path] = pages
+        return BM25Index(chunk_pages(docs_pages)) if docs_pages else None
+
+    return corpus_indexes.get_or_build(key, build)
+
+def retrieve_corpus_chunks(pdf_paths: List[str], question: str, ocr_method: str = "pymupdf",
+                           top_k: int = DEFAULT_TOP_K, mode: str = DEFAULT_RETRIEVAL_MODE) -> List[Chunk]:
     """
-    print("pdf2image OCR not available, using basic text extraction")
-    return extract_pdf_text_per_page(pdf_path, use_ocr=False)
+    Return the top_k chunks for a question across several PDFs
+    """
+    index = get_corpus_index(pdf_paths, ocr_method)
+    if index is None:
+        return []
+    bm25_hits = index.search(question, top_k=top_k)
+    if mode in ("dense", "hybrid"):
+        # Cosine scores are comparable across documents, so merge by score
+        dense_hits = []
+        for path in pdf_paths:
+            dense = get_dense_index(path, ocr_method)
+            if dense is not None:
+                dense_hits.extend(dense.search(question, top_k=top_k))
+        if dense_hits:
+            dense_hits = sorted(dense_hits, key=lambda hit: -hit[1])[:top_k]
+            if mode == "dense":
+                return [chunk for chunk, _ in dense_hits]
+            return [chunk for chunk, _ in reciprocal_rank_fusion([bm25_hits, dense_hits], top_k=top_k)]
+    return [chunk for chunk, _ in bm25_hits]
 
 # ---------- Prompt templates ----------
 JSON_PROMPT = """You are an assistant that answers questions strictly from the provided PDF content.
@@ -129,6 +399,101 @@ QUESTION:
 {user_question}
 """
 
+BATCH_JSON_PROMPT = """You are an assistant that answers several questions strictly from the provided PDF content.
+
+Output JSON schema (return valid JSON only, no extra text):
+{{
+  "answers": [
+    {{
+      "id": <question number as given below>,
+      "answer": "<concise answer or the exact string: The provided PDF does not contain enough information to answer this question.>",
+      "language": "en|zh",
+      "citations": [
+        {{
+          "page": <integer page number, 1-based>,
+          "quote": "<short supporting snippet from that page>"
+        }}
+      ],
+      "confidence": <float 0..1>
+    }}
+  ]
+}}
+
+Rules:
+- Return exactly one entry in "answers" per question, using its number as "id".
+- Use only the PDF content below.
+- If uncertain or unsupported by the text, use the exact insufficiency string above.
+- Keep each "answer" ≤ 120 words unless the question explicitly asks for a long explanation.
+- Always include at least one citation when you provide a substantive answer.
+- Match each question's language (English/Chinese) for "answer" and "language".
+- Do not invent references.
+
+PDF CONTENT (paged):
+{pdf_text_block}
+
+QUESTIONS:
+{questions_block}
+"""
+
+CORPUS_JSON_PROMPT = """You are an assistant that answers questions strictly from the provided PDF documents.
+
+Output JSON schema (return valid JSON only, no extra text):
+{{
+  "answer": "<concise answer or the exact string: The provided PDF does not contain enough information to answer this question.>",
+  "language": "en|zh",
+  "citations": [
+    {{
+      "document": "<file name from the page header>",
+      "page": <integer page number, 1-based>,
+      "quote": "<short supporting snippet from that page>"
+    }}
+  ],
+  "confidence": <float 0..1>
+}}
+
+Rules:
+- Use only the PDF content below; each page header names its document.
+- If uncertain or unsupported by the text, use the exact insufficiency string above.
+- Keep "answer" ≤ 120 words unless the question explicitly asks for a long explanation.
+- Always include at least one citation when you provide a substantive answer.
+- Match the user's language (English/Chinese) for "answer" and "language".
+- Do not invent references.
+
+PDF CONTENT (paged):
+{pdf_text_block}
+
+QUESTION:
+{user_question}
+"""
+
+# Changes whenever a prompt template changes, invalidating cached answers
+PROMPT_VERSION = hashlib.sha1(
+    (JSON_PROMPT + BATCH_JSON_PROMPT + CORPUS_JSON_PROMPT).encode("utf-8")
+).hexdigest()[:12]
+
+def answer_cache_scope(pdf_path: Union[str, List[str]], format_type: str = "json",
+                       ocr_method: str = "pymupdf", top_k: Optional[int] = DEFAULT_TOP_K,
+                       retrieval_mode: str = DEFAULT_RETRIEVAL_MODE) -> str:
+    """
+    Answer-cache scope: PDF content (one path or a corpus), output format,
+    prompt version and the retrieval settings that shape the prompt
+    """
+    paths = [pdf_path] if isinstance(pdf_path, str) else sorted(pdf_path)
+    content = "+".join(extraction_key(path, ocr_method) for path in paths)
+    return "|".join([content, format_type, PROMPT_VERSION,
+                     str(top_k or 0), retrieval_mode if top_k else "all"])
+
+def build_packed_block(ranked: List[Chunk], question: str, prompt_overhead: str,
+                       completion_tokens: int, max_chars: int = 120000) -> str:
+    """
+    Pack ranked chunks into the token budget left after the rest of the
+    prompt and the completion reserve, then render them in page order
+    """
+    with stage("pack"):
+        chunks = pack_chunks(ranked, question, content_budget(prompt_overhead, completion_tokens))
+    with stage("build_block"):
+        return build_retrieved_block(chunks, max_chars=max_chars)
+
 def build_paged_block(docs_pages: Dict[str, List[str]], max_chars: int = 120000) -> str:
     """
     Turn multiple PDFs into a single paged text block
@@ -145,55 +510,138 @@ def build_paged_block(docs_pages: Dict[str, List[str]], max_chars: int = 120000)
             total += len(chunk)
     return "\n".join(lines)
 
-# ---------- Azure OpenAI caller ----------
-def call_azure_openai(prompt: str, format_type: str = "json") -> str:
-    """
-    Calls Azure OpenAI chat completions endpoint.
-    """
+# ---------- LLM caller ----------
+MAX_COMPLETION_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1000"))
+
+def build_messages(prompt: str, format_type: str = "json") -> List[Dict[str, str]]:
     if format_type == "json":
         system_message = "You only answer from the provided PDF content. Return valid JSON only."
     else:
         system_message = "You only answer from the provided PDF content."
-    
-    resp = client.chat.completions.create(
-        model=deployment,
-        messages=[
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.1,
-        max_tokens=1000,
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt},
+    ]
+
+def call_azure_openai(prompt: str, format_type: str = "json", max_tokens: int = MAX_COMPLETION_TOKENS) -> str:
+    """
+    Blocking chat completion through the LLM router (rate limits, retries
+    with backoff and backend failover). Raises LLMUnavailableError when
+    every backend fails.
+    """
+    return get_llm().complete_sync(build_messages(prompt, format_type), max_tokens,
+                                   json_mode=format_type == "json")
+
+# Identical in-flight prompts share one LLM call
+llm_flights = AsyncSingleFlight("llm")
+
+async def call_azure_openai_async(prompt: str, format_type: str = "json", max_tokens: int = MAX_COMPLETION_TOKENS) -> str:
+    """
+    Async variant of call_azure_openai() over pooled HTTP connections.
+    Concurrent calls with an identical prompt share one completion. The HTTP
+    request is aborted once every awaiting task is cancelled.
+    """
+    key = hashlib.sha256(
+        json.dumps([get_llm().primary.model, format_type, max_tokens, prompt]).encode("utf-8")
+    ).hexdigest()
+    return await llm_flights.do(
+        key, lambda: get_llm().complete(build_messages(prompt, format_type), max_tokens,
+                                        json_mode=format_type == "json")
     )
-    return resp.choices[0].message.content.strip()
+
+async def stream_azure_openai_async(prompt: str, format_type: str = "json") -> AsyncIterator[str]:
+    """
+    Yield completion text deltas from the chat completions stream
+    """
+    stream = get_llm().stream(build_messages(prompt, format_type), MAX_COMPLETION_TOKENS,
+                              json_mode=format_type == "json")
+    try:
+        async for delta in stream:
+            yield delta
+    finally:
+        await stream.aclose()
+
+async def close_llm_clients() -> None:
+    if _llm is not None:
+        await _llm.close()
 
 # ---------- Enhanced QA function with OCR options ----------
-def pdf_qa(pdf_path: str, question: str, format_type: str = "json", max_chars: int = 120000, 
-           ocr_method: str = "pymupdf") -> str:
+def build_qa_prompt(pdf_path: Union[str, List[str]], question: str, max_chars: int = 120000,
+                    ocr_method: str = "pymupdf", top_k: Optional[int] = DEFAULT_TOP_K,
+                    retrieval_mode: str = DEFAULT_RETRIEVAL_MODE) -> Optional[str]:
+    """
+    Extract, retrieve and format the QA prompt (the CPU-bound part of
+    pdf_qa()). A list of paths builds a multi-document corpus prompt.
+    Returns None if no text could be extracted.
+    """
+    if not isinstance(pdf_path, str):
+        return build_corpus_prompt(pdf_path, question, max_chars, ocr_method, top_k, retrieval_mode)
+
+    pages = get_pdf_pages(pdf_path, ocr_method)
+    
+    if not pages:
+        return None
+        
+    if top_k:
+        # Retrieve the most relevant chunks for the question
+        with stage("retrieval"):
+            ranked = retrieve_chunks(pdf_path, question, ocr_method, top_k, retrieval_mode)
+    else:
+        # Every page, most relevant first in case they do not all fit
+        ranked = rank_pages({pdf_path: pages}, question)
+    
+    overhead = JSON_PROMPT.format(pdf_text_block="", user_question=question)
+    pdf_text_block = build_packed_block(ranked, question, overhead, MAX_COMPLETION_TOKENS, max_chars)
+    
+    # Build prompt
+    with stage("prompt_format"):
+        return JSON_PROMPT.format(pdf_text_block=pdf_text_block, user_question=question)
+
+def build_corpus_prompt(pdf_paths: List[str], question: str, max_chars: int = 120000,
+                        ocr_method: str = "pymupdf", top_k: Optional[int] = DEFAULT_TOP_K,
+                        retrieval_mode: str = DEFAULT_RETRIEVAL_MODE) -> Optional[str]:
+    """
+    Build a prompt over several PDFs from a merged retrieval across them
+    """
+    if top_k:
+        with stage("retrieval"):
+            ranked = retrieve_corpus_chunks(pdf_paths, question, ocr_method, top_k, retrieval_mode)
+    else:
+        ranked = rank_pages({path: get_pdf_pages(path, ocr_method) for path in pdf_paths}, question)
+    if not ranked:
+        return None
+    overhead = CORPUS_JSON_PROMPT.format(pdf_text_block="", user_question=question)
+    pdf_text_block = build_packed_block(ranked, question, overhead, MAX_COMPLETION_TOKENS, max_chars)
+    with stage("prompt_format"):
+        return CORPUS_JSON_PROMPT.format(pdf_text_block=pdf_text_block, user_question=question)
+
+def _missing_pdf(pdf_path: Union[str, List[str]]) -> Optional[str]:
+    paths = [pdf_path] if isinstance(pdf_path, str) else pdf_path
+    for path in paths:
+        if not os.path.exists(path):
+            return path
+    return None
+
+def pdf_qa(pdf_path: Union[str, List[str]], question: str, format_type: str = "json", max_chars: int = 120000, 
+           ocr_method: str = "pymupdf", top_k: Optional[int] = DEFAULT_TOP_K,
+           retrieval_mode: str = DEFAULT_RETRIEVAL_MODE) -> str:
     """
     Enhanced PDF Question Answering with OCR support
+
+    Only the top_k most relevant page chunks are sent to the model; pass
+    top_k=None (or 0) to send every page up to max_chars instead.
+    retrieval_mode selects "bm25", "dense" or "hybrid" ranking. Passing a
+    list of paths answers from all of them with per-document citations.
     """
     # Check if file exists
-    if not os.path.exists(pdf_path):
-        return f"Error: File not found: {pdf_path}"
+    missing = _missing_pdf(pdf_path)
+    if missing:
+        return f"Error: File not found: {missing}"
     
     try:
-        if ocr_method == "pdf2image":
-            pages = extract_pdf_text_with_pdf2image(pdf_path)
-        elif ocr_method == "no_ocr":
-            pages = extract_pdf_text_per_page(pdf_path, use_ocr=False)
-        else:  # pymupdf (default)
-            pages = extract_pdf_text_per_page(pdf_path, use_ocr=True)
-        
-        if not pages:
+        prompt = build_qa_prompt(pdf_path, question, max_chars, ocr_method, top_k, retrieval_mode)
+        if prompt is None:
             return "Error: Could not extract any text from PDF"
-            
-        docs_pages = {pdf_path: pages}
-        
-        # Build paged text block
-        pdf_text_block = build_paged_block(docs_pages, max_chars=max_chars)
-        
-        # Build prompt
-        prompt = JSON_PROMPT.format(pdf_text_block=pdf_text_block, user_question=question)
         
         # Call Azure OpenAI
         answer = call_azure_openai(prompt, format_type)
@@ -202,3 +650,220 @@ def pdf_qa(pdf_path: str, question: str, format_type: str = "json", max_chars: i
         
     except Exception as e:
         return f"Error processing PDF: {str(e)}"
+
+async def pdf_qa_async(pdf_path: Union[str, List[str]], question: str, format_type: str = "json", max_chars: int = 120000,
+                       ocr_method: str = "pymupdf", top_k: Optional[int] = DEFAULT_TOP_K,
+                       retrieval_mode: str = DEFAULT_RETRIEVAL_MODE) -> str:
+    """
+    Async pdf_qa(): prompt building runs on the shared worker pool and the
+    LLM call uses the async client, so the event loop is never blocked.
+    Cancellation (e.g. asyncio.wait_for timeout) propagates to the LLM call.
+    """
+    missing = _missing_pdf(pdf_path)
+    if missing:
+        return f"Error: File not found: {missing}"
+    
+    try:
+        prompt = await run_in_worker(build_qa_prompt, pdf_path, question, max_chars,
+                                     ocr_method, top_k, retrieval_mode)
+        if prompt is None:
+            return "Error: Could not extract any text from PDF"
+        
+        return await call_azure_openai_async(prompt, format_type)
+        
+    except LLMUnavailableError:
+        # Surfaced to the API as 503 + Retry-After rather than an answer
+        raise
+    except Exception as e:
+        return f"Error processing PDF: {str(e)}"
+
+# ---------- Batch QA ----------
+BATCH_MAX_TOKENS_PER_ANSWER = int(os.getenv("BATCH_MAX_TOKENS_PER_ANSWER", "400"))
+# The model's output limit; a packed prompt's completion reserve must fit in it
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "4096"))
+# Context tokens a packed prompt always keeps for PDF content
+BATCH_MIN_CONTENT_TOKENS = int(os.getenv("BATCH_MIN_CONTENT_TOKENS", "2048"))
+
+def batch_max_tokens(count: int) -> int:
+    """Completion tokens reserved for a packed prompt of `count` questions"""
+    return BATCH_MAX_TOKENS_PER_ANSWER * count + 200
+
+def _max_pack_size() -> int:
+    completion_limit = min(LLM_MAX_OUTPUT_TOKENS, LLM_CONTEXT_TOKENS - BATCH_MIN_CONTENT_TOKENS)
+    return max(1, (completion_limit - batch_max_tokens(0)) // max(1, BATCH_MAX_TOKENS_PER_ANSWER))
+
+# Largest pack_size whose completion reserve fits the output limit and still
+# leaves BATCH_MIN_CONTENT_TOKENS of context for the PDF text
+MAX_PACK_SIZE = _max_pack_size()
+
+def build_batch_prompt(pdf_path: str, questions: List[str], max_chars: int = 120000,
+                       ocr_method: str = "pymupdf", top_k: Optional[int] = DEFAULT_TOP_K,
+                       retrieval_mode: str = DEFAULT_RETRIEVAL_MODE) -> Optional[str]:
+    """
+    Build one prompt answering several questions, using the union of each
+    question's retrieved chunks. Returns None if no text could be extracted.
+    """
+    pages = get_pdf_pages(pdf_path, ocr_method)
+    if not pages:
+        return None
+
+    combined = " ".join(questions)
+    if top_k:
+        # Interleave each question's ranking so every question keeps its best chunks
+        rankings = [retrieve_chunks(pdf_path, q, ocr_method, top_k, retrieval_mode) for q in questions]
+        ranked = []
+        seen = set()
+        for rank in range(top_k):
+            for ranking in rankings:
+                if rank < len(ranking) and ranking[rank] not in seen:
+                    seen.add(ranking[rank])
+                    ranked.append(ranking[rank])
+    else:
+        ranked = rank_pages({pdf_path: pages}, combined)
+
+    questions_block = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, start=1))
+    overhead = BATCH_JSON_PROMPT.format(pdf_text_block="", questions_block=questions_block)
+    pdf_text_block = build_packed_block(ranked, combined, overhead, batch_max_tokens(len(questions)), max_chars)
+    return BATCH_JSON_PROMPT.format(pdf_text_block=pdf_text_block, questions_block=questions_block)
+
+
+def split_batch_answer(answer: str, count: int) -> List[Optional[str]]:
+    """
+    Split a multi-answer JSON completion into per-question JSON strings in
+    the single-answer schema; entries the model skipped come back as None
+    """
+    parsed, _ = parse_json_answer(answer)
+    items = parsed.get("answers") if parsed is not None else None
+    if not isinstance(items, list):
+        return [None] * count
+
+    results: List[Optional[str]] = [None] * count
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            position = int(item.pop("id")) - 1
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= position < count:
+            results[position] = json.dumps(item, ensure_ascii=False)
+    return results
+
+def _batch_groups(count: int, format_type: str, pack_size: int) -> List[List[int]]:
+    # Packing relies on the multi-answer JSON schema
+    size = min(max(1, pack_size), MAX_PACK_SIZE) if format_type == "json" else 1
+    return [list(range(i, min(i + size, count))) for i in range(0, count, size)]
+
+def _answer_group(pdf_path: str, questions: List[str], indices: List[int], format_type: str,
+                  max_chars: int, ocr_method: str, top_k: Optional[int],
+                  retrieval_mode: str) -> List[Tuple[int, str]]:
+    if len(indices) > 1:
+        group = [questions[i] for i in indices]
+        prompt = build_batch_prompt(pdf_path, group, max_chars, ocr_method, top_k, retrieval_mode)
+        if prompt is None:
+            return [(i, "Error: Could not extract any text from PDF") for i in indices]
+        answer = call_azure_openai(prompt, "json",
+                                   max_tokens=batch_max_tokens(len(indices)))
+        parts = split_batch_answer(answer, len(indices))
+        # Questions the packed answer did not cover are asked individually
+        return [(i, part) if part is not None
+                else (i, pdf_qa(pdf_path, questions[i], format_type, max_chars, ocr_method, top_k, retrieval_mode))
+                for i, part in zip(indices, parts)]
+    i = indices[0]
+    return [(i, pdf_qa(pdf_path, questions[i], format_type, max_chars, ocr_method, top_k, retrieval_mode))]
+
+async def _answer_group_async(pdf_path: str, questions: List[str], indices: List[int], format_type: str,
+                              max_chars: int, ocr_method: str, top_k: Optional[int],
+                              retrieval_mode: str) -> List[Tuple[int, str]]:
+    if len(indices) > 1:
+        group = [questions[i] for i in indices]
+        prompt = await run_in_worker(build_batch_prompt, pdf_path, group, max_chars,
+                                     ocr_method, top_k, retrieval_mode)
+        if prompt is None:
+            return [(i, "Error: Could not extract any text from PDF") for i in indices]
+        answer = await call_azure_openai_async(prompt, "json",
+                                               max_tokens=batch_max_tokens(len(indices)))
+        results = []
+        for i, part in zip(indices, split_batch_answer(answer, len(indices))):
+            if part is None:
+                # Questions the packed answer did not cover are asked individually
+                part = await pdf_qa_async(pdf_path, questions[i], format_type, max_chars,
+                                          ocr_method, top_k, retrieval_mode)
+            results.append((i, part))
+        return results
+    i = indices[0]
+    return [(i, await pdf_qa_async(pdf_path, questions[i], format_type, max_chars,
+                                   ocr_method, top_k, retrieval_mode))]
+
+def pdf_qa_batch(pdf_path: str, questions: List[str], format_type: str = "json", max_chars: int = 120000,
+                 ocr_method: str = "pymupdf", top_k: Optional[int] = DEFAULT_TOP_K,
+                 retrieval_mode: str = DEFAULT_RETRIEVAL_MODE, concurrency: int = 4,
+                 pack_size: int = 1) -> Iterator[Tuple[int, str]]:
+    """
+    Answer many questions against one PDF, yielding (question index, answer)
+    as each completes. The PDF is extracted and indexed once; questions are
+    dispatched with at most `concurrency` LLM calls in flight, and with
+    pack_size > 1 (JSON format only) several questions share one prompt.
+    """
+    if not os.path.exists(pdf_path):
+        for i in range(len(questions)):
+            yield i, f"Error: File not found: {pdf_path}"
+        return
+
+    # Extract and index up front so the workers all hit a warm cache
+    get_pdf_index(pdf_path, ocr_method)
+
+    groups = _batch_groups(len(questions), format_type, pack_size)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(_answer_group, pdf_path, questions, indices, format_type,
+                            max_chars, ocr_method, top_k, retrieval_mode): indices
+            for indices in groups
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield from future.result()
+            except Exception as e:
+                for i in futures[future]:
+                    yield i, f"Error processing PDF: {str(e)}"
+
+async def pdf_qa_batch_async(pdf_path: str, questions: List[str], format_type: str = "json",
+                             max_chars: int = 120000, ocr_method: str = "pymupdf",
+                             top_k: Optional[int] = DEFAULT_TOP_K,
+                             retrieval_mode: str = DEFAULT_RETRIEVAL_MODE, concurrency: int = 4,
+                             pack_size: int = 1, timeout: Optional[float] = None) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Async pdf_qa_batch(); `timeout` bounds each LLM round trip
+    """
+    if not os.path.exists(pdf_path):
+        for i in range(len(questions)):
+            yield i, f"Error: File not found: {pdf_path}"
+        return
+
+    # Extract and index up front so every group hits a warm cache
+    await run_in_worker(get_pdf_index, pdf_path, ocr_method)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_group(indices: List[int]) -> List[Tuple[int, str]]:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    _answer_group_async(pdf_path, questions, indices, format_type,
+                                        max_chars, ocr_method, top_k, retrieval_mode),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                return [(i, "Error: Request timeout - processing took too long") for i in indices]
+            except Exception as e:
+                return [(i, f"Error processing PDF: {str(e)}") for i in indices]
+
+    tasks = [asyncio.create_task(run_group(indices))
+             for indices in _batch_groups(len(questions), format_type, pack_size)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for item in await next_done:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
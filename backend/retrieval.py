@@ -0,0 +1,259 @@
+import os
+import re
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from singleflight import SingleFlight
+
+# ---------- Configuration ----------
+DEFAULT_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+DEFAULT_RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "bm25")  # bm25 | dense | hybrid
+CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "200"))
+INDEX_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_INDEX_CACHE_MAX_ENTRIES", "32"))
+# Merged multi-document indexes, kept apart so per-document churn cannot evict them
+CORPUS_INDEX_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CORPUS_INDEX_CACHE_MAX_ENTRIES", "4"))
+
+# Latin words/numbers, or single CJK characters so Chinese questions still match
+TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+
+
+class Chunk:
+    """
+    A span of one extracted page: pages[page - 1][start:end].
+
+    Only the offsets are stored; the text is sliced from the page list when
+    read. With the page store that list is a MappedPages view, so indexes in
+    every worker share the one mapped copy of the text instead of each
+    holding their own. Chunks compare and hash by (source, page, start, end).
+    """
+
+    __slots__ = ("source", "page", "start", "end", "_pages", "_text")
+
+    def __init__(self, source: str, page: int, start: int, end: int,
+                 pages: Optional[Sequence[str]] = None, text: Optional[str] = None):
+        self.source = source
+        self.page = page  # 1-based page number, kept for citations
+        self.start = start
+        self.end = end
+        self._pages = pages
+        self._text = text
+
+    @property
+    def text(self) -> str:
+        if self._text is not None:
+            return self._text
+        return self._pages[self.page - 1][self.start:self.end]
+
+    def with_text(self, text: str) -> "Chunk":
+        """The same span carrying replacement text (e.g. trimmed to fit a budget)"""
+        return Chunk(self.source, self.page, self.start, self.end, self._pages, text)
+
+    def _key(self) -> Tuple[str, int, int, int]:
+        return (self.source, self.page, self.start, self.end)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Chunk) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return f"Chunk({self.source!r}, page={self.page}, span={self.start}:{self.end})"
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+# ---------- Chunking ----------
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def chunk_spans(text: str, chunk_chars: int = CHUNK_CHARS,
+                overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """
+    Split one page into overlapping (start, end) windows, preferring
+    whitespace boundaries
+    """
+    start, stop = _strip_span(text, 0, len(text))
+    if stop - start <= chunk_chars:
+        return [(start, stop)] if stop > start else []
+
+    spans = []
+    while start < stop:
+        end = min(start + chunk_chars, stop)
+        if end < stop:
+            # Back off to the last whitespace so words are not split
+            split = text.rfind("\n", start + chunk_chars // 2, end)
+            if split == -1:
+                split = text.rfind(" ", start + chunk_chars // 2, end)
+            if split != -1:
+                end = split
+        span = _strip_span(text, start, end)
+        if span[1] > span[0]:
+            spans.append(span)
+        if end >= stop:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+def chunk_pages(docs_pages: Dict[str, Sequence[str]], chunk_chars: int = CHUNK_CHARS,
+                overlap: int = CHUNK_OVERLAP) -> List[Chunk]:
+    """
+    Turn {pdf_path: pages} into a flat list of page-tagged chunk spans that
+    read their text from `pages`
+    """
+    chunks = []
+    for fname, pages in docs_pages.items():
+        for page_num, text in enumerate(pages, start=1):
+            for start, end in chunk_spans(text, chunk_chars, overlap):
+                chunks.append(Chunk(fname, page_num, start, end, pages))
+    return chunks
+
+
+# ---------- BM25 ----------
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of chunks, backed by an inverted index.
+    Chunk text is read once while indexing; only spans and postings are kept.
+    """
+
+    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+
+        for chunk_id, chunk in enumerate(chunks):
+            terms = Counter(tokenize(chunk.text))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((chunk_id, tf))
+
+        n = len(chunks)
+        self.avg_length = (sum(self.doc_lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """Return {chunk_id: score} for chunks sharing at least one query term"""
+        scores: Dict[int, float] = {}
+        avg = self.avg_length or 1.0
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for chunk_id, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[chunk_id] / avg)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K) -> List[Tuple[Chunk, float]]:
+        """
+        Return the top_k (chunk, score) pairs, best first. If nothing matches,
+        the leading chunks are returned so the model still gets some context.
+        """
+        scores = self.scores(query)
+        if not scores:
+            return [(chunk, 0.0) for chunk in self.chunks[:top_k]]
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [(self.chunks[chunk_id], score) for chunk_id, score in ranked]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[Chunk, float]]], top_k: int = DEFAULT_TOP_K,
+                           k: int = 60) -> List[Tuple[Chunk, float]]:
+    """
+    Merge several ranked hit lists (e.g. BM25 and dense) by reciprocal rank
+    """
+    fused: Dict[Chunk, float] = {}
+    for ranking in rankings:
+        for rank, (chunk, _) in enumerate(ranking):
+            fused[chunk] = fused.get(chunk, 0.0) + 1.0 / (k + rank + 1)
+    ranked = sorted(fused.items(), key=lambda item: -item[1])
+    return ranked[:top_k]
+
+
+# ---------- Prompt block ----------
+def build_retrieved_block(chunks: List[Chunk], max_chars: int = 120000) -> str:
+    """
+    Render retrieved chunks in document order with the same page headers as
+    build_paged_block(), merging chunks that share a page
+    """
+    order = {}
+    for chunk in chunks:
+        order.setdefault((chunk.source, chunk.page), []).append(chunk.text)
+
+    lines = []
+    total = 0
+    for (fname, page), texts in sorted(order.items(), key=lambda item: (item[0][0], item[0][1])):
+        header = f"=== {os.path.basename(fname)} — Page {page} ==="
+        block = f"{header}\n" + "\n...\n".join(texts) + "\n"
+        if total + len(block) > max_chars:
+            break
+        lines.append(block)
+        total += len(block)
+    return "\n".join(lines)
+
+
+# ---------- Index cache ----------
+class IndexCache:
+    """
+    Small thread-safe LRU for per-document indexes, keyed by extraction key
+    """
+
+    def __init__(self, max_entries: int = INDEX_CACHE_MAX_ENTRIES, name: str = "index"):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight(name)
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key: str, build: Callable[[], object]):
+        """Return the cached index, building it once even under concurrent misses"""
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return index
+            self.misses += 1
+        return self._flights.do(key, lambda: self._build(key, build))
+
+    def _build(self, key: str, build: Callable[[], object]):
+        with self._lock:
+            index = self._entries.get(key)
+        if index is not None:
+            return index
+        index = build()
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+bm25_indexes = IndexCache()
+corpus_indexes = IndexCache(CORPUS_INDEX_CACHE_MAX_ENTRIES, name="corpus_index")
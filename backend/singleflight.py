@@ -0,0 +1,94 @@
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from metrics import Counter, register
+
+T = TypeVar("T")
+
+COALESCED = register(Counter("pdfqa_coalesced_total",
+                             "Calls served by another caller's in-flight work, by kind"))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Thread-level duplicate call suppression: while do(key, fn) is running,
+    other threads calling do() with the same key wait for that call and
+    share its result (or exception) instead of running fn again
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED.inc(kind=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    asyncio variant of SingleFlight. The shared work runs as its own task, so
+    one waiter timing out or disconnecting does not cancel it for the
+    others; it is cancelled only when every waiter has gone.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # key -> [task, number of waiters]
+        self._flights: Dict[str, list] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(fn())
+            flight = self._flights[key] = [task, 0]
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        else:
+            COALESCED.inc(kind=self.name)
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not task.done():
+                task.cancel()
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        flight = self._flights.get(key)
+        if flight is not None and flight[0] is task:
+            del self._flights[key]
+        # Mark the exception as retrieved when no waiter was left to see it
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,68 @@
+import re
+import json
+from typing import Optional
+
+# Matches the opening of the "answer" string value in the model's JSON
+ANSWER_KEY_RE = re.compile(r'"answer"\s*:\s*"')
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class AnswerStreamExtractor:
+    """
+    Incrementally pulls the "answer" string out of a streamed JSON completion.
+
+    feed() takes raw completion deltas and returns any newly decoded answer
+    text, so the answer can be forwarded before the JSON object is complete.
+    Citations and confidence are parsed from the full text once it ends.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos: Optional[int] = None  # index of next unread answer char
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        self.buffer += delta
+        if self.done:
+            return ""
+        if self._pos is None:
+            match = ANSWER_KEY_RE.search(self.buffer)
+            if match is None:
+                return ""
+            self._pos = match.end()
+
+        out = []
+        i = self._pos
+        buf = self.buffer
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # Escape sequence: wait for the rest of it if it is split
+            if i + 1 >= len(buf):
+                break
+            code = buf[i + 1]
+            if code == "u":
+                if i + 6 > len(buf):
+                    break
+                try:
+                    out.append(chr(int(buf[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+            else:
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+
+def ndjson_line(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected
+
+
+def controller(**kwargs):
+    options = dict(max_active=2, batch_max_active=1, max_queue={INTERACTIVE: 2, BATCH: 2},
+                   max_wait={INTERACTIVE: 5.0, BATCH: 5.0}, client_rate=0)
+    options.update(kwargs)
+    adm = AdmissionController(**options)
+    adm.hold_seconds = {INTERACTIVE: 0.01, BATCH: 0.01}
+    return adm
+
+
+async def hold(adm, priority, name, order, seconds=0.05, units=1):
+    async with adm.slot(priority, units):
+        order.append(name)
+        await asyncio.sleep(seconds)
+
+
+def test_interactive_admitted_before_queued_batch():
+    async def scenario():
+        adm = controller()
+        order = []
+        tasks = [asyncio.create_task(hold(adm, BATCH, "b1", order)),
+                 asyncio.create_task(hold(adm, INTERACTIVE, "i1", order))]
+        await asyncio.sleep(0.01)
+        # Both units busy: queue a batch first, then interactive requests
+        tasks.append(asyncio.create_task(hold(adm, BATCH, "b2", order)))
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(hold(adm, INTERACTIVE, f"i{n}", order)) for n in (2, 3)]
+        await asyncio.gather(*tasks)
+        return order, adm
+
+    order, adm = asyncio.run(scenario())
+    assert order.index("i2") < order.index("b2") and order.index("i3") < order.index("b2")
+    assert adm.active == {INTERACTIVE: 0, BATCH: 0}
+
+
+def test_batch_capped_at_batch_max_active():
+    async def scenario():
+        adm = controller(max_active=4, batch_max_active=2)
+        async with adm.slot(BATCH, 8) as units:
+            assert units == 2
+            # The rest stays free for interactive traffic
+            async with adm.slot(INTERACTIVE), adm.slot(INTERACTIVE):
+                assert adm.active == {INTERACTIVE: 2, BATCH: 2}
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        adm = controller(max_active=1, max_queue={INTERACTIVE: 1, BATCH: 1})
+        order = []
+        running = asyncio.create_task(hold(adm, INTERACTIVE, "a", order, 0.1))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(hold(adm, INTERACTIVE, "b", order, 0.0))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await adm.acquire(INTERACTIVE)
+        await asyncio.gather(running, queued)
+        return rejected.value, order
+
+    error, order = asyncio.run(scenario())
+    assert error.status == 429 and int(error.retry_after_header) >= 1
+    assert order == ["a", "b"]
+
+
+def test_wait_timeout_returns_503_and_frees_queue():
+    async def scenario():
+        adm = controller(max_active=1, max_wait={INTERACTIVE: 0.02, BATCH: 1.0})
+        order = []
+        running = asyncio.create_task(hold(adm, INTERACTIVE, "a", order, 0.1))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await adm.acquire(INTERACTIVE)
+        assert len(adm.queues[INTERACTIVE]) == 0
+        await running
+        return rejected.value, adm
+
+    error, adm = asyncio.run(scenario())
+    assert error.status == 503
+    assert adm.active[INTERACTIVE] == 0
+
+
+def test_client_rate_limit():
+    adm = controller(client_rate=60, client_burst=2)
+    adm.check_rate("ip:1.2.3.4")
+    adm.check_rate("ip:1.2.3.4")
+    with pytest.raises(AdmissionRejected) as rejected:
+        adm.check_rate("ip:1.2.3.4")
+    assert rejected.value.status == 429
+    adm.check_rate("ip:5.6.7.8")  # other clients have their own bucket
+
+
+def test_unknown_api_keys_fall_back_to_client_ip(monkeypatch):
+    import admission
+
+    monkeypatch.setattr(admission, "API_KEYS", frozenset({"valid"}))
+    assert admission.client_key({"X-API-Key": "valid"}, "1.2.3.4") == "key:valid"
+    assert admission.client_key({"X-API-Key": "made-up"}, "1.2.3.4") == "ip:1.2.3.4"
@@ -0,0 +1,37 @@
+import time
+
+from answer_cache import AnswerCache, normalize_question
+
+
+def test_normalized_questions_share_an_entry():
+    cache = AnswerCache(max_entries=4, ttl_seconds=60)
+    cache.put("scope", "How do I   inspect the harness?", "answer")
+    assert normalize_question("how do i inspect the harness") == "how do i inspect the harness"
+    assert cache.get("scope", "how do I inspect the harness") == "answer"
+    assert cache.get("other-scope", "how do I inspect the harness") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    cache.put("s", "a", 1)
+    cache.put("s", "b", 2)
+    assert cache.get("s", "a") == 1  # a is now most recently used
+    cache.put("s", "c", 3)
+    assert cache.get("s", "b") is None
+    assert cache.get("s", "a") == 1 and cache.get("s", "c") == 3
+
+
+def test_ttl_expiry():
+    cache = AnswerCache(max_entries=4, ttl_seconds=0.01)
+    cache.put("s", "q", 1)
+    time.sleep(0.02)
+    assert cache.get("s", "q") is None
+
+
+def test_near_duplicate_matching():
+    cache = AnswerCache(max_entries=4, ttl_seconds=60, similarity_threshold=0.6)
+    cache.put("s", "how should the harness be inspected", "answer")
+    assert cache.get("s", "how should the harness be inspected daily") == "answer"
+    assert cache.near_hits == 1
+    assert cache.get("s", "where is the skylight clip") is None
@@ -0,0 +1,72 @@
+from answer_parsing import normalize_text, parse_json_answer, quote_in_text, repair_json, validate_citations
+
+
+def test_valid_object_followed_by_braced_prose():
+    text = '{"answer": "x", "citations": [{"page": 2, "quote": "a"}]}\n\nNote: {see page 2}'
+    assert repair_json(text) == {"answer": "x", "citations": [{"page": 2, "quote": "a"}]}
+
+
+def test_braces_inside_strings_and_trailing_junk():
+    text = '{"answer": "He said {hi}", "language": "en"} trailing } junk'
+    assert repair_json(text) == {"answer": "He said {hi}", "language": "en"}
+
+
+def test_fenced_json():
+    assert repair_json('Here you go:\n```json\n{"answer": "ok"}\n```') == {"answer": "ok"}
+
+
+def test_truncated_string_is_closed():
+    assert repair_json('{"answer": "partial tex') == {"answer": "partial tex"}
+
+
+def test_truncated_citation_leaves_no_empty_item():
+    text = '{"answer": "x", "citations": [{"page": 1, "quote": "q"}, {"page":'
+    assert repair_json(text) == {"answer": "x", "citations": [{"page": 1, "quote": "q"}]}
+
+
+def test_unparseable_returns_none():
+    assert repair_json("no json here") is None
+    assert parse_json_answer("no json here") == (None, "failed")
+
+
+def test_parse_outcomes():
+    assert parse_json_answer('{"answer": "a"}') == ({"answer": "a"}, "ok")
+    assert parse_json_answer('{"answer": "a"') == ({"answer": "a"}, "repaired")
+
+
+def test_quote_matching_normalizes_quotes_and_ellipsis():
+    page = normalize_text("The  “harness” must be\ninspected before every use by the operator.")
+    assert quote_in_text('the "harness" must be inspected', page)
+    assert quote_in_text("harness ... by the operator", page)
+    assert not quote_in_text("operator ... harness", page)
+
+
+PAGES = ["Intro text.", "Check the straps daily.", "Store in a dry place.", "Other", "Other", "Other",
+         "Replace after a fall."]
+
+
+def validate(citations, find_pages=None):
+    return validate_citations(citations, {"manual.pdf": "/docs/manual.pdf"}, lambda path: PAGES, find_pages)
+
+
+def test_citation_verified_on_cited_page():
+    [cite] = validate([{"page": 2, "quote": "check the straps"}])
+    assert cite["verified"] is True and cite["page"] == 2
+
+
+def test_citation_on_neighbouring_page_is_corrected():
+    [cite] = validate([{"page": 2, "quote": "dry place"}])
+    assert cite["verified"] is True and cite["page"] == 3
+
+
+def test_far_page_needs_index_hint():
+    [cite] = validate([{"page": 2, "quote": "Replace after a fall"}])
+    assert cite["verified"] is False
+    [cite] = validate([{"page": 2, "quote": "Replace after a fall"}], lambda path, quote: [7])
+    assert cite["verified"] is True and cite["page"] == 7
+
+
+def test_unknown_document_is_unchecked():
+    citations = validate_citations([{"page": 1, "quote": "x", "document": "other.pdf"}],
+                                   {"a.pdf": "/a.pdf", "b.pdf": "/b.pdf"}, lambda path: PAGES)
+    assert citations[0]["verified"] is None
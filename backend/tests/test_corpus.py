@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+import pdf_qa
+from corpus import CorpusRegistry, document_name
+from pdf_cache import ExtractionCache
+from retrieval import IndexCache
+
+
+def write_pdf(path, lines):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for text in lines:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_document_names():
+    assert document_name("Foo Bar-2.pdf") == "foo_bar_2"
+    assert document_name("harness-gear-operation-manual.pdf") == "harness_gear"
+    assert document_name("---.pdf") == "document"
+
+
+def test_scan_dedupes_names_and_resolves(tmp_path):
+    for name in ("a b.pdf", "a-b.pdf", "notes.txt"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+    registry = CorpusRegistry(str(tmp_path))
+    assert sorted(registry.scan()) == ["a_b", "a_b_2"]
+
+    assert registry.resolve() == registry.resolve(["all"]) == registry.documents
+    assert registry.resolve(["a_b_2"]) == {"a_b_2": str(tmp_path / "a-b.pdf")}
+    with pytest.raises(KeyError):
+        registry.resolve(["a_b", "missing"])
+
+
+def test_registered_documents_survive_rescans(tmp_path):
+    outside = tmp_path / "elsewhere.pdf"
+    outside.write_bytes(b"%PDF-1.4")
+    (tmp_path / "pdfs").mkdir()
+    registry = CorpusRegistry(str(tmp_path / "pdfs"))
+    registry.scan()
+    before = registry.documents
+    assert registry.register(str(outside), "manual") == "manual"
+    assert before == {}  # readers holding the old mapping see no change
+    registry.scan()
+    assert registry.get("manual") == str(outside)
+
+
+def test_reserved_and_taken_names(tmp_path):
+    for name in ("all.pdf", "manual.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+    registry = CorpusRegistry(str(tmp_path))
+    assert sorted(registry.scan()) == ["all_2", "manual"]
+
+    other = str(tmp_path / "other.pdf")
+    with pytest.raises(ValueError):
+        registry.register(other, "all")
+    with pytest.raises(FileExistsError):
+        registry.register(other, "manual")
+    assert registry.get("manual") == str(tmp_path / "manual.pdf")
+    # Re-registering the same file under its own name is not a collision
+    assert registry.register(str(tmp_path / "manual.pdf"), "manual") == "manual"
+    assert registry.register(other, "manual", replace=True) == "manual"
+    assert registry.get("manual") == other
+
+
+@pytest.fixture
+def isolated_caches(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_qa, "extraction_cache", ExtractionCache(str(tmp_path / "cache")))
+    # A per-document cache smaller than the corpus, as with hundreds of manuals
+    monkeypatch.setattr(pdf_qa, "bm25_indexes", IndexCache(2))
+    monkeypatch.setattr(pdf_qa, "corpus_indexes", IndexCache(2, name="corpus_index"))
+    return pdf_qa
+
+
+def test_corpus_index_is_built_once(tmp_path, isolated_caches):
+    paths = []
+    for n in range(4):
+        path = tmp_path / f"manual{n}.pdf"
+        write_pdf(path, [f"manual {n} inspect the harness", f"manual {n} store it dry"])
+        paths.append(str(path))
+
+    first = pdf_qa.get_corpus_index(paths)
+    misses = pdf_qa.extraction_cache.misses, pdf_qa.corpus_indexes.misses
+    assert {chunk.source for chunk in first.chunks} == set(paths)
+
+    second = pdf_qa.get_corpus_index(list(reversed(paths)))
+    assert second is first
+    assert (pdf_qa.extraction_cache.misses, pdf_qa.corpus_indexes.misses) == misses
+    assert pdf_qa.corpus_indexes.hits == 1
+    assert pdf_qa.bm25_indexes.misses == 0  # per-document indexes were never touched
+
+
+def test_corpus_index_rebuilt_when_a_document_changes(tmp_path, isolated_caches):
+    paths = [str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]
+    write_pdf(paths[0], ["harness"])
+    write_pdf(paths[1], ["skylight"])
+    first = pdf_qa.get_corpus_index(paths)
+    write_pdf(paths[1], ["skylight clip", "mesh"])
+    os.utime(paths[1], ns=(1, 1))
+    second = pdf_qa.get_corpus_index(paths)
+    assert second is not first
+    assert max(chunk.page for chunk in second.chunks) == 2
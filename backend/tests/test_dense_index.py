@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from dense_index import DenseIndexStore, HashingEmbedder  # noqa: E402
+from retrieval import chunk_pages  # noqa: E402
+
+PAGES = ["Inspect the harness webbing for cuts before every use. " * 8,
+         "Store the harness in a cool dry place away from chemicals. " * 8]
+
+
+def chunks_for(pages, **params):
+    return chunk_pages({"/docs/manual.pdf": pages}, **params)
+
+
+def assert_rows_match(index, chunks, embedder):
+    assert np.allclose(np.asarray(index.matrix), embedder.embed([c.text for c in chunks]))
+
+
+def test_chunking_change_with_same_row_count_is_rebuilt(tmp_path):
+    embedder = HashingEmbedder(64)
+    store = DenseIndexStore(str(tmp_path))
+    before = chunks_for(PAGES, chunk_chars=300, overlap=50)
+    after = chunks_for(PAGES, chunk_chars=260, overlap=20)
+    assert len(before) == len(after) and [c.text for c in before] != [c.text for c in after]
+
+    store.get_or_build("v1", "/docs/manual.pdf", before, embedder)
+    # A fresh process (empty memory cache) with new chunk settings, same extraction key
+    index = DenseIndexStore(str(tmp_path)).get_or_build("v1", "/docs/manual.pdf", after, embedder)
+    assert_rows_match(index, after, embedder)
+
+
+def test_new_version_reuses_rows_and_removes_the_old_files(tmp_path, capsys):
+    embedder = HashingEmbedder(64)
+    store = DenseIndexStore(str(tmp_path))
+    store.get_or_build("v1", "/docs/manual.pdf", chunks_for(PAGES), embedder)
+    changed = chunks_for([PAGES[0], "Replace the harness after any fall arrest."])
+    index = store.get_or_build("v2", "/docs/manual.pdf", changed, embedder)
+
+    assert_rows_match(index, changed, embedder)
+    assert "embedded 1, reused 1" in capsys.readouterr().out
+    assert not any(name.startswith("v1.") for name in os.listdir(tmp_path))
@@ -0,0 +1,32 @@
+import pytest
+
+from doc_store import MappedPages, write_pages
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "doc.pages")
+    pages = ["first page", "", "ünïcödé ✓ 中文", "last"]
+    write_pages(path, pages)
+
+    mapped = MappedPages(path)
+    assert len(mapped) == 4
+    assert list(mapped) == pages
+    assert mapped[-1] == "last"
+    assert mapped[1:3] == pages[1:3]
+    assert bytes(mapped.raw(2)) == pages[2].encode("utf-8")
+    assert mapped.byte_size(2) == len(pages[2].encode("utf-8"))
+    with pytest.raises(IndexError):
+        mapped[4]
+
+
+def test_empty_document(tmp_path):
+    path = str(tmp_path / "empty.pages")
+    write_pages(path, [])
+    assert len(MappedPages(path)) == 0
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "bad.pages"
+    path.write_bytes(b"not a page store at all")
+    with pytest.raises(ValueError):
+        MappedPages(str(path))
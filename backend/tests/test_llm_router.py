@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import llm_backends
+from llm_backends import LLMBackend, LLMRouter, LLMUnavailableError, estimate_tokens
+
+MESSAGES = [{"role": "user", "content": "How should the harness be inspected?"}]
+MAX_TOKENS = 100
+ESTIMATE = estimate_tokens(MESSAGES, MAX_TOKENS)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, message="error"):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+class Ledger:
+    """Token bucket stand-in that tracks the net tokens taken"""
+
+    def __init__(self):
+        self.balance = 0
+
+    def reserve(self, amount):
+        self.balance -= amount
+        return 0.0
+
+    def refund(self, amount):
+        self.balance += amount
+
+
+class FakeStream:
+    def __init__(self, deltas, usage=None):
+        self.chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=d))], usage=None)
+                       for d in deltas]
+        if usage is not None:
+            self.chunks.append(SimpleNamespace(choices=[], usage=usage))
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class ScriptedBackend(LLMBackend):
+    """Returns (or raises) the next scripted outcome on each call"""
+
+    def __init__(self, name, *script):
+        super().__init__("test-model", rpm=0, tpm=0)
+        self.name = name
+        self.script = list(script)
+        self.json_modes = []
+        self.tokens = Ledger()
+
+    def create(self, messages, max_tokens, stream=False, json_mode=False):
+        self.json_modes.append(json_mode and self.json_mode)
+        outcome = self.script.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    async def acreate(self, messages, max_tokens, stream=False, json_mode=False):
+        return self.create(messages, max_tokens, stream, json_mode)
+
+
+def response(text, total_tokens=30):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f" {text} "))],
+                           usage=SimpleNamespace(prompt_tokens=total_tokens - 10, completion_tokens=10,
+                                                 total_tokens=total_tokens))
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(llm_backends, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(llm_backends, "LLM_RETRY_BASE_SECONDS", 0.001)
+
+
+def test_retries_then_keeps_only_the_used_tokens():
+    backend = ScriptedBackend("a", StatusError(503), StatusError(429), response("ok", total_tokens=30))
+    assert LLMRouter([backend]).complete_sync(MESSAGES, MAX_TOKENS) == "ok"
+    assert backend.tokens.balance == -30
+    assert backend.blocked_until > 0  # the 429 paused the backend
+
+
+def test_fails_over_on_non_retryable_error():
+    first = ScriptedBackend("a", StatusError(401))
+    second = ScriptedBackend("b", response("from b"))
+    assert LLMRouter([first, second]).complete_sync(MESSAGES, MAX_TOKENS) == "from b"
+    assert first.script == [] and first.tokens.balance == 0
+
+
+def test_all_backends_failing_refunds_every_reservation():
+    first = ScriptedBackend("a", *[StatusError(429)] * 3)
+    second = ScriptedBackend("b", StatusError(500), StatusError(400))
+    with pytest.raises(LLMUnavailableError) as error:
+        asyncio.run(LLMRouter([first, second]).complete(MESSAGES, MAX_TOKENS))
+    assert first.tokens.balance == second.tokens.balance == 0
+    assert "a: 429" in str(error.value) and "b: 400" in str(error.value)
+
+
+def test_json_mode_rejection_retries_without_it():
+    backend = ScriptedBackend("a", StatusError(400, "response_format is not supported"), response("{}"))
+    assert LLMRouter([backend]).complete_sync(MESSAGES, MAX_TOKENS, json_mode=True) == "{}"
+    assert backend.json_modes == [True, False]
+
+
+async def collect(agen):
+    return [delta async for delta in agen]
+
+
+def test_stream_retries_before_first_delta_and_records_usage():
+    stream = FakeStream(["Hel", "lo"], usage=SimpleNamespace(prompt_tokens=20, completion_tokens=2,
+                                                             total_tokens=22))
+    backend = ScriptedBackend("a", StatusError(502), stream)
+    assert asyncio.run(collect(LLMRouter([backend]).stream(MESSAGES, MAX_TOKENS))) == ["Hel", "lo"]
+    assert stream.closed
+    assert backend.tokens.balance == -22
+
+
+def test_stream_without_usage_is_counted_locally():
+    backend = ScriptedBackend("a", FakeStream(["Inspect ", "daily."]))
+    asyncio.run(collect(LLMRouter([backend]).stream(MESSAGES, MAX_TOKENS)))
+    assert -ESTIMATE < backend.tokens.balance < 0
+
+
+def test_stream_closed_when_consumer_stops_early():
+    stream = FakeStream(["a", "b", "c"])
+    backend = ScriptedBackend("a", stream)
+
+    async def first_delta():
+        agen = LLMRouter([backend]).stream(MESSAGES, MAX_TOKENS)
+        delta = await agen.__anext__()
+        await agen.aclose()
+        return delta
+
+    assert asyncio.run(first_delta()) == "a"
+    assert stream.closed
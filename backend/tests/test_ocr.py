@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import ocr
+from pdf_cache import ExtractionCache, PartialPages
+
+fitz = pytest.importorskip("fitz")
+
+
+@pytest.fixture
+def drawing_pdf(tmp_path):
+    """Page 1 has a text layer; page 2 only draws, so it needs OCR"""
+    path = str(tmp_path / "drawing.pdf")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Fix the mesh with the clip shown on the next page.")
+    doc.new_page().draw_rect(fitz.Rect(100, 100, 300, 300))
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def text_layer(path):
+    with fitz.open(path) as doc:
+        return [page.get_text("text").strip() for page in doc]
+
+
+def test_missing_engine_gives_partial_pages(drawing_pdf, monkeypatch):
+    monkeypatch.setattr(ocr, "resolve_engine", lambda: None)
+    pages = ocr.ocr_missing_text(drawing_pdf, text_layer(drawing_pdf))
+    assert isinstance(pages, PartialPages)
+    assert pages.missing == [1]
+    assert pages[0].startswith("Fix the mesh")
+
+
+def test_failed_page_gives_partial_pages(drawing_pdf, monkeypatch, tmp_path):
+    def fail(*args, **kwargs):
+        raise RuntimeError("tesseract crashed")
+
+    monkeypatch.setattr(ocr, "resolve_engine", lambda: "pymupdf")
+    monkeypatch.setattr(ocr, "ocr_page", fail)
+    monkeypatch.setattr(ocr, "ocr_cache", ocr.OCRCache(str(tmp_path / "ocr")))
+    pages = ocr.ocr_missing_text(drawing_pdf, text_layer(drawing_pdf))
+    assert isinstance(pages, PartialPages) and pages.missing == [1]
+
+
+def test_ocr_result_is_complete(drawing_pdf, monkeypatch, tmp_path):
+    monkeypatch.setattr(ocr, "resolve_engine", lambda: "pymupdf")
+    monkeypatch.setattr(ocr, "ocr_page", lambda path, i, engine: "CLIP DETAIL A")
+    monkeypatch.setattr(ocr, "ocr_cache", ocr.OCRCache(str(tmp_path / "ocr")))
+    pages = ocr.ocr_missing_text(drawing_pdf, text_layer(drawing_pdf))
+    assert not isinstance(pages, PartialPages)
+    assert pages[1] == "CLIP DETAIL A"
+
+
+def test_partial_pages_are_not_cached(drawing_pdf, tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    calls = []
+
+    def extract(path):
+        calls.append(path)
+        return PartialPages(["text", ""], [1]) if len(calls) == 1 else ["text", "ocr text"]
+
+    assert cache.get_or_extract(drawing_pdf, "ocr", extract).missing == [1]
+    assert not os.path.exists(cache.cache_dir) or os.listdir(cache.cache_dir) == []
+    assert list(cache.get_or_extract(drawing_pdf, "ocr", extract)) == ["text", "ocr text"]
+    assert list(cache.get_or_extract(drawing_pdf, "ocr", extract)) == ["text", "ocr text"]
+    assert len(calls) == 2
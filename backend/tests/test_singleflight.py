@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "index"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("doc", work))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ["index"] * 8
+    # Once finished, the next call runs again
+    assert flight.do("doc", lambda: "rebuilt") == "rebuilt"
+
+
+def test_waiters_share_the_error():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        time.sleep(0.05)
+        raise ValueError("broken pdf")
+
+    def call():
+        try:
+            flight.do("doc", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_async_waiters_share_one_task():
+    async def scenario():
+        flight = AsyncSingleFlight("test")
+        calls = []
+
+        async def answer():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("prompt", answer) for _ in range(5)))
+        return results, calls, flight._flights
+
+    results, calls, flights = asyncio.run(scenario())
+    assert results == ["answer"] * 5 and calls == [1]
+    assert flights == {}
+
+
+def test_async_one_waiter_leaving_does_not_cancel_the_others():
+    async def scenario():
+        flight = AsyncSingleFlight("test")
+
+        async def answer():
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        impatient = asyncio.create_task(flight.do("prompt", answer))
+        patient = asyncio.create_task(flight.do("prompt", answer))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(scenario()) == "answer"
+
+
+def test_async_work_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        flight = AsyncSingleFlight("test")
+        finished = []
+
+        async def answer():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+
+        waiters = [asyncio.create_task(flight.do("prompt", answer)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        task = flight._flights["prompt"][0]
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.06)
+        return task, finished, flight._flights
+
+    task, finished, flights = asyncio.run(scenario())
+    assert task.cancelled() and finished == [] and flights == {}
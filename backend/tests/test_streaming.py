@@ -0,0 +1,32 @@
+import json
+
+from streaming import AnswerStreamExtractor
+
+
+def feed_all(deltas):
+    extractor = AnswerStreamExtractor()
+    return "".join(extractor.feed(delta) for delta in deltas), extractor
+
+
+def test_extracts_answer_split_across_deltas():
+    text, extractor = feed_all(['{"ans', 'wer": "Hel', 'lo wor', 'ld", "confidence": 0.9}'])
+    assert text == "Hello world"
+    assert extractor.done
+
+
+def test_escape_split_between_deltas():
+    text, _ = feed_all(['{"answer": "a\\', 'nb \\"q\\" \\u00', 'e9"}'])
+    assert text == 'a\nb "q" é'
+
+
+def test_ignores_text_after_answer_and_keeps_buffer():
+    deltas = ['{"answer": "x", ', '"citations": [{"page": 1, "quote": "y"}]}']
+    text, extractor = feed_all(deltas)
+    assert text == "x"
+    assert json.loads(extractor.buffer)["citations"][0]["page"] == 1
+
+
+def test_no_answer_key_yields_nothing():
+    text, extractor = feed_all(["plain text ", "without json"])
+    assert text == ""
+    assert not extractor.done
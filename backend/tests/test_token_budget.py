@@ -0,0 +1,28 @@
+import pytest
+
+import token_budget
+
+
+@pytest.fixture
+def unloaded(monkeypatch):
+    monkeypatch.setattr(token_budget, "_encoding", None)
+    monkeypatch.setattr(token_budget, "tokenizer_error", None)
+    monkeypatch.setattr(token_budget, "TOKENIZER_ENCODING", "cl100k_base")
+
+
+def test_unavailable_encoding_degrades_to_estimate(unloaded, monkeypatch):
+    tiktoken = pytest.importorskip("tiktoken")
+
+    def offline(name):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", offline)
+    assert token_budget.load_tokenizer() == "estimate"
+    assert "no network" in token_budget.get_tokenizer_error()
+    assert token_budget.count_tokens("Inspect the harness, then clip in.") == 8
+
+
+def test_estimate_mode_skips_tiktoken(unloaded, monkeypatch):
+    monkeypatch.setattr(token_budget, "TOKENIZER_ENCODING", "estimate")
+    assert token_budget.load_tokenizer() == "estimate"
+    assert token_budget.get_tokenizer_error() is None
@@ -0,0 +1,161 @@
+import os
+import re
+from typing import List, Optional
+
+from retrieval import Chunk, tokenize
+
+# ---------- Configuration ----------
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "8192"))
+# Optional hard cap on prompt size, independent of the context window
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))
+# "estimate" skips tiktoken and always uses the rough estimate
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+# Room left for chat-message framing and tokenizer drift
+SAFETY_MARGIN_TOKENS = 64
+# Smallest remaining budget worth filling with a trimmed chunk
+MIN_TRIM_TOKENS = 48
+
+# Rough estimate used when tiktoken is not installed or not loaded yet
+_ESTIMATE_RE = re.compile(r"\w+|[^\w\s]")
+
+_encoding = None
+tokenizer_error: Optional[str] = None
+
+
+def load_tokenizer() -> str:
+    """
+    Load the tiktoken encoding at startup (preload), never on the request
+    path. The BPE file comes from TIKTOKEN_CACHE_DIR, which the Docker image
+    pre-populates. Returns the tokenizer in use: "estimate" without tiktoken,
+    or when the encoding cannot be loaded (e.g. no baked BPE file and no
+    network), in which case the reason is kept in tokenizer_error.
+    """
+    global _encoding, tokenizer_error
+    if _encoding is not None:
+        return TOKENIZER_ENCODING
+    if TOKENIZER_ENCODING == "estimate":
+        return "estimate"
+    try:
+        import tiktoken
+    except ImportError:
+        return "estimate"
+    try:
+        _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        tokenizer_error = f"tiktoken encoding '{TOKENIZER_ENCODING}' unavailable: {e}"
+        print(f"{tokenizer_error}; estimating token counts")
+        return "estimate"
+    tokenizer_error = None
+    return TOKENIZER_ENCODING
+
+
+def get_tokenizer_error() -> Optional[str]:
+    """Why the configured encoding could not be loaded, if it could not"""
+    return tokenizer_error
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the loaded tokenizer, or estimate until it is loaded"""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(_ESTIMATE_RE.findall(text))
+
+
+def content_budget(prompt_overhead: str, completion_tokens: int) -> int:
+    """
+    Tokens available for PDF content: the context window (or
+    PROMPT_TOKEN_BUDGET, if smaller) minus the completion reserve and the
+    rest of the prompt
+    """
+    limit = LLM_CONTEXT_TOKENS - completion_tokens
+    if PROMPT_TOKEN_BUDGET:
+        limit = min(limit, PROMPT_TOKEN_BUDGET)
+    return max(0, limit - count_tokens(prompt_overhead) - SAFETY_MARGIN_TOKENS)
+
+
+# ---------- Packing ----------
+def _header_tokens(chunk: Chunk) -> int:
+    return count_tokens(f"=== {os.path.basename(chunk.source)} — Page {chunk.page} ===\n") + 2
+
+
+def trim_to_relevant(text: str, question: str, max_tokens: int) -> Optional[str]:
+    """
+    Keep the contiguous run of lines around the best query match that fits
+    in max_tokens, marking cut edges with "..."
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return None
+    terms = set(tokenize(question))
+    scores = [sum(1 for t in tokenize(line) if t in terms) for line in lines]
+    costs = [count_tokens(line) + 1 for line in lines]
+
+    best = max(range(len(lines)), key=lambda i: (scores[i], -i))
+    if costs[best] > max_tokens:
+        # A single oversized line: cut it by characters proportionally
+        keep = max(1, len(lines[best]) * max_tokens // costs[best])
+        return lines[best][:keep] + " ..."
+
+    start = end = best
+    used = costs[best]
+    while True:
+        left = start - 1 if start > 0 and used + costs[start - 1] <= max_tokens else None
+        right = end + 1 if end + 1 < len(lines) and used + costs[end + 1] <= max_tokens else None
+        if left is None and right is None:
+            break
+        # Grow toward the more relevant neighbour, preferring following context
+        if right is not None and (left is None or scores[right] >= scores[left]):
+            end = right
+            used += costs[right]
+        else:
+            start = left
+            used += costs[left]
+
+    kept = "\n".join(lines[start:end + 1])
+    if start > 0:
+        kept = "...\n" + kept
+    if end < len(lines) - 1:
+        kept = kept + "\n..."
+    return kept
+
+
+def pack_chunks(ranked: List[Chunk], question: str, budget_tokens: int) -> List[Chunk]:
+    """
+    Fit chunks (most relevant first) into budget_tokens. A chunk that does
+    not fit whole is trimmed around its most relevant lines rather than
+    dropped; packing continues with smaller chunks after it.
+    """
+    packed = []
+    used = 0
+    for chunk in ranked:
+        remaining = budget_tokens - used
+        header = _header_tokens(chunk)
+        if remaining - header < MIN_TRIM_TOKENS:
+            break
+        cost = header + count_tokens(chunk.text)
+        if cost <= remaining:
+            packed.append(chunk)
+            used += cost
+            continue
+        trimmed = trim_to_relevant(chunk.text, question, remaining - header)
+        if trimmed:
+            packed.append(chunk.with_text(trimmed))
+            used += header + count_tokens(trimmed)
+    return packed
+
+
+def rank_pages(docs_pages: dict, question: str) -> List[Chunk]:
+    """
+    Turn whole pages into chunks ordered by query-term overlap, so packing
+    without retrieval keeps the most relevant pages when space runs out
+    """
+    terms = set(tokenize(question))
+    pages = [
+        Chunk(fname, page_num, 0, len(text), page_texts)
+        for fname, page_texts in docs_pages.items()
+        for page_num, text in enumerate(page_texts, start=1)
+        if text.strip()
+    ]
+    scores = [sum(1 for t in tokenize(chunk.text) if t in terms) for chunk in pages]
+    order = sorted(range(len(pages)), key=lambda i: (-scores[i], i))
+    return [pages[i] for i in order]
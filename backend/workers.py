@@ -0,0 +1,70 @@
+import os
+import asyncio
+import contextvars
+import threading
+import multiprocessing
+import concurrent.futures
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# ---------- Configuration ----------
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", str(min(32, (os.cpu_count() or 1) + 4))))
+PROCESS_POOL_SIZE = int(os.getenv("PROCESS_POOL_SIZE", str(os.cpu_count() or 1)))
+
+_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_process_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# ---------- Shared worker pool ----------
+def get_worker_pool() -> concurrent.futures.ThreadPoolExecutor:
+    """
+    Return the application-wide pool used for blocking extraction/indexing work
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=WORKER_POOL_SIZE, thread_name_prefix="pdf-worker"
+            )
+        return _pool
+
+
+async def run_in_worker(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking function on the shared pool without blocking the event loop.
+    The caller's contextvars (e.g. request timings) are visible in the worker.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_worker_pool(), partial(context.run, func, *args, **kwargs))
+
+
+# ---------- Shared process pool ----------
+def get_process_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Return the application-wide process pool for CPU-heavy page extraction.
+    Children come from a forkserver (spawn where unavailable), never a fork
+    of this process: forking while the event loop and worker threads run
+    would copy locks those threads hold.
+    """
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=PROCESS_POOL_SIZE, mp_context=multiprocessing.get_context(method)
+            )
+        return _process_pool
+
+
+def shutdown_worker_pool() -> None:
+    global _pool, _process_pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None